@@ -4,6 +4,7 @@ import matplotlib as mpl
 mpl.rcParams['font.size'] = 48
 mpl.rc('text', usetex=True)
 import suggestiongraphs as SG
+import pythonmodules.perturbationfamily as pf
 import DSGRN, subprocess,sys
 
 
@@ -65,7 +66,9 @@ def wavepool_network1_Dukediscussion_perturbations_5D_2016_08_15(fname='/Users/b
     makeHistogram(bigpercents,45,extrapoints,xlabel,title,axislims)
     print bestones
 
-def wavepool_network1_Dukediscussion_perturbations_5D_2016_08_23(fname='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/5D_2016_08_23_wavepool_network1_Dukediscussion_noregulationswap_selfedges_results.json'):
+def wavepool_network1_Dukediscussion_perturbations_5D_2016_08_23(fname='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/5D_2016_08_23_wavepool_network1_Dukediscussion_noregulationswap_selfedges_results.json',family_file=None):
+    # family_file is the family file of results that store network deltas (see pythonmodules/perturbationfamily.py)
+    family = pf.FamilyReader(family_file) if family_file else None
     lod = json.load(open(fname,'r'))
     N = len(lod)
     # print N
@@ -73,7 +76,7 @@ def wavepool_network1_Dukediscussion_perturbations_5D_2016_08_23(fname='/Users/b
     notzeros=[ d for d in lod  if d['SingleFPQueryParameterCount']>0 ]
     percents=[ float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount'])*100 for d in notzeros ]
     bigpercents=[ p for p in percents if p > 2 ]
-    bestones=sorted([ (p,d["Network"]) for p,d in zip(percents,notzeros) if p > 25 ],reverse=True)
+    bestones=sorted([ (p,pf.getNetworkSpecFromResults(d,family)) for p,d in zip(percents,notzeros) if p > 25 ],reverse=True)
     extrapoints = [(float(lod[0]['SingleFPQueryParameterCount'])/int(lod[0]['ParameterCount']),100)]
     nounicode=dict()
     for item in d['SingleFPQuery'].iteritems():
@@ -85,21 +88,22 @@ def wavepool_network1_Dukediscussion_perturbations_5D_2016_08_23(fname='/Users/b
     # for z in bestones:
     #     print z
     
-def wavepool_network1_Dukediscussion_perturbations_suggestiongraphs(network_spec_file='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/5D_2016_08_02_wavepool_network1_Dukediscussion.txt', fname='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/5D_2016_08_23_wavepool_network1_Dukediscussion_noregulationswap_selfedges_results.json'):
+def wavepool_network1_Dukediscussion_perturbations_suggestiongraphs(network_spec_file='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/5D_2016_08_02_wavepool_network1_Dukediscussion.txt', fname='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/5D_2016_08_23_wavepool_network1_Dukediscussion_noregulationswap_selfedges_results.json',family_file=None):
+    family = pf.FamilyReader(family_file) if family_file else None
     with open(network_spec_file,'r') as f:
         network_spec = f.read()
     with open(fname,'r') as f:
         lod = json.load(f)
-    list_of_networks = [ d["Network"] for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.10 ]
+    list_of_networks = [ pf.getNetworkSpecFromResults(d,family) for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.10 ]
     print "\n\nEdges suggested by all {} networks with greater than {}% SBF, HCM1 high, rest low FP:\n".format(len(list_of_networks),10)
     getSuggestedEdges(network_spec,list_of_networks)
-    list_of_networks = [ d["Network"] for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.15 ]
+    list_of_networks = [ pf.getNetworkSpecFromResults(d,family) for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.15 ]
     print "\n\nEdges suggested by all {} networks with greater than {}% SBF, HCM1 high, rest low FP:\n".format(len(list_of_networks),15)
     getSuggestedEdges(network_spec,list_of_networks)
-    list_of_networks = [ d["Network"] for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.20 ]
+    list_of_networks = [ pf.getNetworkSpecFromResults(d,family) for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.20 ]
     print "\n\nEdges suggested by all {} networks with greater than {}% SBF, HCM1 high, rest low FP:\n".format(len(list_of_networks),20)
     getSuggestedEdges(network_spec,list_of_networks)
-    list_of_networks = [ d["Network"] for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.25 ]
+    list_of_networks = [ pf.getNetworkSpecFromResults(d,family) for d in lod  if float(d['SingleFPQueryParameterCount'])/int(d['ParameterCount']) > 0.25 ]
     print "\n\nEdges suggested by all {} networks with greater than {}% SBF, HCM1 high, rest low FP:\n".format(len(list_of_networks),25)
     getSuggestedEdges(network_spec,list_of_networks)
 
@@ -115,7 +119,8 @@ def getSuggestedEdges(network_spec,list_of_networks):
     for c,e in zip(counts,edges):
         print str(e) + ': ' + str(c)
 
-def wavepool_network2_Dukediscussion_perturbations_6D_2016_08_02(network_spec_file='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/6D_2016_08_02_wavepool_network2_Dukediscussion.txt',fname='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/6D_2016_08_02_wavepool_network2_Dukediscussion_results.json'):
+def wavepool_network2_Dukediscussion_perturbations_6D_2016_08_02(network_spec_file='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/6D_2016_08_02_wavepool_network2_Dukediscussion.txt',fname='/Users/bcummins/ProjectSimulationResults/wavepool_networkperturbations_paper_data/6D_2016_08_02_wavepool_network2_Dukediscussion_results.json',family_file=None):
+    family = pf.FamilyReader(family_file) if family_file else None
     # with open(network_spec_file,'r') as f:
     #     network_spec = f.read()
     with open(fname,'r') as f:
@@ -125,7 +130,7 @@ def wavepool_network2_Dukediscussion_perturbations_6D_2016_08_02(network_spec_fi
     # print lod[0]["Network"]
     N = len(lod)
     percents=[ float(d['StableFCParameterCount'])/int(d['ParameterCount'])*100 for d in lod ]
-    list_of_networks = [ d["Network"] for (p,d) in zip(percents,lod)  if p > 0.00 ]
+    list_of_networks = [ pf.getNetworkSpecFromResults(d,family) for (p,d) in zip(percents,lod)  if p > 0.00 ]
     nonzeros = [p for p in percents if p > 1]
     bestones=[ d for p,d in zip(nonzeros,list_of_networks) if p > 50 ]
     extrapoints = [(float(lod[0]['StableFCParameterCount'])/int(lod[0]['ParameterCount']),50)]
@@ -134,7 +139,7 @@ def wavepool_network2_Dukediscussion_perturbations_6D_2016_08_02(network_spec_fi
     axislims = [0,100,0,100]
     makeHistogram(nonzeros,45,extrapoints,xlabel,title,axislims)
     for b in bestones: print b
-    getSuggestedEdges(lod[0]["Network"],list_of_networks[1:])
+    getSuggestedEdges(pf.getNetworkSpecFromResults(lod[0],family),list_of_networks[1:])
 
 def YaoNetworks_fullinducibility(fname='/Users/bcummins/ProjectSimulationResults/YaoNetworks/YaoNetworks_nonessential_fullinducibilityresults.json'):
     # format: (len(bistability),len(resettablebistab),len(induc),len(fullinduc),num_factor_graphs)
@@ -279,11 +284,12 @@ def E2FNetworks_hysteresis(fname='/Users/bcummins/ProjectSimulationResults/E2FNa
         print 'Hysteresis: {:.1f}%'.format(float(value[1])/value[0]*100)
         print set(value[2]).issubset(value[4]),"\n"
 
-def wavepool_9networks(fname='/Users/bcummins/ProjectSimulationResults/wavepool4patternmatch_paper/wavepool_9networks.json'):
+def wavepool_9networks(fname='/Users/bcummins/ProjectSimulationResults/wavepool4patternmatch_paper/wavepool_9networks.json',family_file=None):
+    family = pf.FamilyReader(family_file) if family_file else None
     with open(fname,'r') as f:
         wd = json.load(f)
     for d in wd:
-        print d["Network"] + "\n"
+        print pf.getNetworkSpecFromResults(d,family) + "\n"
         print str(d["ParameterCount"]) + "/" + str(d["StableFCParameterCount"]) + "/" + str(d["StableFCMatchesParameterCount"]) + "\n"
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import pythonmodules.intervalgraph as ig
+import pythonmodules.perturbationfamily as pf
 import itertools,sys
 
 # This code only works if the order of the variables in the reference network spec is repeated in the perturbed network specs (see lines marked (*))
@@ -14,12 +15,24 @@ def getAllSuggestionGraphs(network_spec,list_of_networks):
         for v in oldnodes: 
             for c in ref_graph.adjacencies(v): 
                 new_graph.remove_edge(v,c)  # (*) variable order dependence
-        # pick out new nodes that have only a self-loop as an in-edge
-        newnodesselfedges = [v for v in new_graph.vertices() if v not in oldnodes and set([v]) == new_graph.transpose().adjacencies(v)] # (*) variable order dependence
-        for u in newnodesselfedges: new_graph.remove_edge(u,u) # this avoids some infinite loops in the recursion, increases computation speed, and does not affect the edges we seek
-        suggestion_graphs.append(_computeSuggestionGraph(new_graph,oldnodes,newnodesselfedges))
+        suggestion_graphs.append(_getSuggestionGraph(new_graph,oldnodes))
     return ref_graph,suggestion_graphs
 
+def getAllSuggestionGraphsFromFamily(family):
+    # same as getAllSuggestionGraphs for the networks of a perturbationfamily.FamilyReader
+    # the deltas hold the added nodes and edges by label, so there is no dependence on variable order
+    ref_graph = family.seed_graph()
+    oldnodes = sorted(list(ref_graph.vertices()))
+    suggestion_graphs = [ _getSuggestionGraph(pf.deltaGraph(ref_graph,delta),oldnodes) for uid,delta in family if delta ]
+    return ref_graph,suggestion_graphs
+
+def _getSuggestionGraph(new_graph,oldnodes):
+    # new_graph holds only the added edges
+    # pick out new nodes that have only a self-loop as an in-edge
+    newnodesselfedges = [v for v in new_graph.vertices() if v not in oldnodes and set([v]) == new_graph.transpose().adjacencies(v)] # (*) variable order dependence
+    for u in newnodesselfedges: new_graph.remove_edge(u,u) # this avoids some infinite loops in the recursion, increases computation speed, and does not affect the edges we seek
+    return _computeSuggestionGraph(new_graph,oldnodes,newnodesselfedges)
+
 def _computeSuggestionGraph(reduced_graph,oldnodes,newnodesselfedges):
     rownodes = oldnodes+newnodesselfedges
     suggestion_graph = ig.Graph()
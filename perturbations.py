@@ -12,5 +12,5 @@ if comp not in ['qsub','sbatch','local']:
     sys.exit()
 else:
     job=Job(sys.argv[1])
-    job.prep()
-    job.run()	
+    # networks are handed to the scheduler as they are constructed
+    job.stream()
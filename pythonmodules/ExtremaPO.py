@@ -14,11 +14,16 @@ def GrowComponent(ts,epsilon,comp):
 		else:
 			return False
 
+	# lowest and highest values of ts over comp; the candidate intersects every time in comp exactly when it
+	# intersects the times with these values, so it is not checked against each time
+	extent = [min(ts[t] for t in comp), max(ts[t] for t in comp)]
+
 	def isgoodcandidate(candidate,comp):
-		for time in comp:
-			if not BoolIntersect(candidate,time):
-				return False
-		return True
+		return extent[1] - ts[candidate] <= 2*epsilon and extent[0] - ts[candidate] >= -2*epsilon
+
+	def include(t):
+		extent[0] = min(extent[0],ts[t])
+		extent[1] = max(extent[1],ts[t])
 
 	def growleft(comp):
 		# Proceed to check interval overlap to the left of the component only
@@ -27,6 +32,7 @@ def GrowComponent(ts,epsilon,comp):
 			if not isgoodcandidate(candidate,comp): 
 				return comp
 			comp.insert(0, candidate)
+			include(candidate)
 			candidate -= 1
 		return comp
 
@@ -38,6 +44,7 @@ def GrowComponent(ts,epsilon,comp):
 			if not isgoodcandidate(candidate,comp): 
 				return comp
 			comp.append(candidate)
+			include(candidate)
 			candidate += 1
 		return comp
 
@@ -60,9 +67,11 @@ def GrowComponent(ts,epsilon,comp):
 				return comp
 			elif beg_good and (not end_good):
 				comp.insert(0, candidate_beg)			
+				include(candidate_beg)
 				return growleft(comp)
 			elif (not beg_good) and end_good:
 				comp.append(candidate_end)
+				include(candidate_end)
 				return growright(comp)
 			else:
 				if not BoolIntersect(candidate_beg,candidate_end):
@@ -70,6 +79,8 @@ def GrowComponent(ts,epsilon,comp):
 				else:
 					comp.insert(0,candidate_beg)
 					comp.append(candidate_end)
+					include(candidate_beg)
+					include(candidate_end)
 					candidate_beg -= 1
 					candidate_end += 1
 					if candidate_beg == -1:
@@ -97,6 +108,11 @@ def BuildEIList(ts,step):
 		epsilon += step
 	return eiList
 
+def Span(comp):
+	# Components are grown from one time by adding neighboring times, so they are runs of consecutive times and
+	# the first and last times identify them. Used as a hashable key for a component.
+	return (comp[0],comp[-1])
+
 def MinMaxLabel(eiList,ts):
 	# Sorts the unique components grown into two lists, minList and maxList
 	# Inputs: eiList, ts
@@ -106,7 +122,9 @@ def MinMaxLabel(eiList,ts):
 	flat_ei = list(itertools.chain.from_iterable(eiList))
 	# get unique elements while preserving order on the flattened eiList 
 	# (note we throw away duplicates at the beginning of the list)
-	compList = [item for k,item in enumerate(flat_ei) if item not in flat_ei[k+1:]]
+	# components are runs of consecutive times, so a component is identified by its span (first time, last time)
+	last = dict( (Span(item),k) for k,item in enumerate(flat_ei) )
+	compList = [item for k,item in enumerate(flat_ei) if last[Span(item)] == k]
 	minList = []
 	maxList = []
 	for comp in compList:
@@ -135,6 +153,8 @@ def MinMaxLabel(eiList,ts):
 # this as labeledChains.
 def BuildChains(eiList,ts,step):
 	minList,maxList = MinMaxLabel(eiList,ts)
+	minSpans = set(Span(comp) for comp in minList)
+	maxSpans = set(Span(comp) for comp in maxList)
 	chainList = []
 	labeledChains = []
 	for i in range(0,len(eiList[0])):
@@ -144,9 +164,9 @@ def BuildChains(eiList,ts,step):
 		ndx = 0
 		for item in list:
 			chainList[ndx].append(item)
-			if item in minList:
+			if Span(item) in minSpans:
 				labeledChains[ndx].append('min')
-			elif item in maxList:
+			elif Span(item) in maxSpans:
 				labeledChains[ndx].append('max')
 			else:
 				labeledChains[ndx].append('n/a')
@@ -0,0 +1,295 @@
+import numpy as np
+import intervalgraph, parametercount
+import networkperturbations as perturb
+
+#####################################################################################################################
+# Batched network perturbation with numpy. A batch of candidate networks is held as signed int8 adjacency arrays
+# (1 for 'a', -1 for 'r', 0 for no edge) over a fixed list of node slots, and each edge or node addition is drawn for
+# every candidate at once. The random choices follow perturbNetworkWithNodesAndEdges and perturbNetworkWithEdgesOnly
+# in networkperturbations. Only the candidates that survive the additions and the parameter count screen are turned
+# into network specs.
+#####################################################################################################################
+
+REGULATION = {'a' : 1, 'r' : -1}
+
+# number of rounds of drawing at random before the remaining candidates are drawn from a mask of all valid choices
+MAXDRAWS = 8
+
+
+class PerturbationBatch(object):
+    """ Makes random perturbations of starting_graph as in networkperturbations.makePerturbation, batchsize at a time.
+        params are the perturbNetwork parameters. If starting_graph is a parametercount.ParameterCountGraph, candidates
+        with too many parameters or no logic files are dropped before their network specs are made.
+        Edgelist edges and nodelist nodes are drawn in proportion to params['edgeweights'] and params['nodeweights'], when given.
+        Structural constraints in params (see networkperturbations.Constraints) are checked on the finished candidates,
+        except for self-loops on added nodes, which are added with them.
+    """
+
+    def __init__(self, starting_graph, params, seed=None):
+        self.random_ = np.random.RandomState(None if seed is None else seed % 2**32)
+        self.maxadditions_ = params['maxadditionspergraph']
+        self.maxparams_ = int(params['maxparams'])
+        self.swap_ = params['swap_edge_reg']
+        self.logicpath_ = getattr(starting_graph,'logicpath_',None)
+        self.addnodes_ = bool(params['nodelist'] or (not params['edgelist'] and params['add_madeup_nodes'] == 'y'))
+        self.anonymous_ = not params['nodelist']
+        # node slots: the starting network, then either made-up nodes in the order they are added or the new nodelist nodes
+        self.numfixed_ = len(starting_graph.vertices())
+        labels = [ starting_graph.vertex_label(v) for v in range(self.numfixed_) ]
+        if self.addnodes_ and self.anonymous_:
+            for k in range(self.maxadditions_):
+                labels.append(perturb.getMadeupNodeLabel(labels))
+        elif self.addnodes_:
+            for n in params['nodelist']:
+                if n not in labels: labels.append(n)
+        self.labels_ = labels
+        L = len(labels)
+        self.adjacency_ = np.zeros((L,L),dtype=np.int8)
+        for (u,v) in starting_graph.edges():
+            self.adjacency_[u,v] = REGULATION[starting_graph.edge_label(u,v)]
+        # the edgelist as arrays of slots, without the edges between nodes that can never be in the network
+        slots = dict( (label,k) for k,label in enumerate(labels) )
+        edges = sorted(set( (slots[e[0]],slots[e[1]],REGULATION[e[2]]) for e in (params['edgelist'] or []) if e[0] in slots and e[1] in slots ))
+        self.edgelist_ = bool(params['edgelist'])
+        self.src_, self.tgt_, self.reg_ = [ np.array(x,dtype=int) for x in zip(*edges) ] if edges else [ np.zeros(0,dtype=int) ]*3
+        # weights of the edgelist edges and of the node slots (nodeweights only matter for nodelist nodes), or None
+        edgeweights, nodeweights = params.get('edgeweights'), params.get('nodeweights')
+        self.edgeweights_ = np.array([ edgeweights.get((labels[u],labels[v],'a' if r > 0 else 'r'),1.0) for u,v,r in edges ]) if edgeweights else None
+        self.nodeweights_ = np.array([ nodeweights.get(label,1.0) for label in labels ]) if nodeweights else None
+        # constraints: whether each entry of the adjacency arrays may be changed to -1 or 1 (indexed by value+1; edges are never removed),
+        # and the required edges as (source slot, target slot, regulation), which are all missing if some node can't be added
+        constraints = perturb.getConstraints(params)
+        self.selfloops_ = bool(constraints) and constraints.selfloops_
+        self.changeable_ = None
+        if constraints:
+            self.changeable_ = np.ones((L,L,3),dtype=bool)
+            for u,source in enumerate(labels):
+                for v,target in enumerate(labels):
+                    self.changeable_[u,v,0] = constraints.allows(source,target,'r')
+                    self.changeable_[u,v,2] = constraints.allows(source,target,'a')
+            required = [ (e[0] in slots and e[1] in slots,e) for e in constraints.required_ ]
+            self.required_ = [ (slots[e[0]],slots[e[1]],REGULATION[e[2]]) for found,e in required if found ]
+            self.unreachable_ = not all(found for found,e in required)
+
+    def sample(self, batchsize, stats=None):
+        """ Return the canonical network specs of the surviving candidates out of batchsize attempts.
+            The outcomes of the others are recorded in stats (a networkperturbations.PerturbationStats), if given.
+        """
+        B, L = batchsize, len(self.labels_)
+        adj = np.repeat(self.adjacency_[np.newaxis],B,axis=0)
+        present = np.zeros((B,L),dtype=bool)
+        present[:,:self.numfixed_] = True
+        failed = np.zeros(B,dtype=bool)
+        remaining = self.random_.randint(1,self.maxadditions_+1,size=B)
+        for step in range(self.maxadditions_):
+            active = (remaining > 0) & ~failed
+            if not active.any(): break
+            remaining -= active
+            if self.addnodes_:
+                addnode = active & (self.random_.randint(2,size=B) == 0)
+            else:
+                addnode = np.zeros(B,dtype=bool)
+            for additions,add in [(active & ~addnode,self._addEdges),(addnode,self._addNodes)]:
+                idx = np.flatnonzero(additions)
+                if len(idx): failed[idx[~add(adj,present,idx)]] = True
+        if stats: stats.record('failed',int(failed.sum()))
+        survivors = ~failed
+        if self.changeable_ is not None:
+            violations = survivors & ~self._satisfied(adj)
+            if stats: stats.record('constraint',int(violations.sum()))
+            survivors &= ~violations
+        if self.logicpath_ is not None:
+            survivors &= self._screen(adj,present,survivors,stats)
+        return self._networkSpecs(adj,present,np.flatnonzero(survivors),stats)
+
+    def _addEdges(self, adj, present, idx):
+        # add one edge to each candidate in idx, in place; return which candidates succeeded
+        # edges are drawn as in networkperturbations.addEdge
+        sub_adj, sub_present = adj[idx], present[idx]
+        k = len(idx)
+        rows = np.arange(k)
+        if self.edgelist_:
+            # a random edge from the edgelist between nodes in the network that isn't already there
+            # (with its regulation, if swap_edge_reg)
+            if not len(self.reg_): return np.zeros(k,dtype=bool)
+            def valid(r,e):
+                current = sub_adj[r,self.src_[e],self.tgt_[e]]
+                ok = sub_present[r,self.src_[e]] & sub_present[r,self.tgt_[e]]
+                return ok & ((current != self.reg_[e]) if self.swap_ else (current == 0))
+            if self.edgeweights_ is not None and not self.edgeweights_.sum(): return np.zeros(k,dtype=bool)
+            def draw(r):
+                if self.edgeweights_ is None: return self.random_.randint(len(self.reg_),size=len(r))
+                return self.random_.choice(len(self.reg_),size=len(r),p=self.edgeweights_/self.edgeweights_.sum())
+            def allvalid(r):
+                return valid(r[:,np.newaxis],np.arange(len(self.reg_))[np.newaxis])
+            choice = self._drawValid(rows,draw,valid,allvalid,k,self.edgeweights_)
+            ok = choice >= 0
+            u, v, reg = self.src_[choice], self.tgt_[choice], self.reg_[choice]
+        else:
+            # a random edge between nodes in the network, except negative self-loops and existing edges
+            # (with their regulation, if swap_edge_reg); trivial graphs, and complete graphs without swapping, can't get one
+            numnodes = sub_present.sum(1)
+            ok = numnodes >= 2
+            if not self.swap_: ok &= (sub_adj != 0).sum(axis=(1,2)) < numnodes**2
+            L = len(self.labels_)
+            def decode(choice):
+                return choice // (2*L), (choice // 2) % L, 1-2*(choice % 2)
+            def valid(r,choice):
+                u, v, reg = decode(choice)
+                current = sub_adj[r,u,v]
+                ok = sub_present[r,u] & sub_present[r,v]
+                if self.swap_: return ok & (current != reg) & ~((u == v) & (reg == -1))
+                return ok & (current == 0)
+            def draw(r):
+                u = self._choose(sub_present[r])
+                v = self._choose(sub_present[r])
+                return (u*L+v)*2 + self.random_.randint(2,size=len(r))
+            def allvalid(r):
+                return valid(r[:,np.newaxis],np.arange(2*L*L)[np.newaxis])
+            choice = self._drawValid(rows[ok],draw,valid,allvalid,k)
+            ok &= choice >= 0
+            u, v, reg = decode(choice)
+            if not self.swap_: reg = np.where(u == v,1,reg)
+        good = np.flatnonzero(ok)
+        adj[idx[good],u[good],v[good]] = reg[good]
+        return ok
+
+    def _addNodes(self, adj, present, idx):
+        # add one node with an in-edge and an out-edge to each candidate in idx, in place; return which candidates succeeded
+        # nodes and edges are drawn as in networkperturbations.addNodeAndConnectingEdges
+        sub_adj, sub_present = adj[idx], present[idx]
+        k = len(idx)
+        rows = np.arange(k)
+        randomreg = lambda : 1-2*self.random_.randint(2,size=k)
+        if self.anonymous_:
+            # made-up nodes fill the slots after the starting network in order
+            node = sub_present.sum(1)
+            ok = node < len(self.labels_)
+            node = np.minimum(node,len(self.labels_)-1)
+        else:
+            # a random nodelist node that isn't in the network yet
+            new = ~sub_present
+            new[:,:self.numfixed_] = False
+            if self.edgelist_:
+                # that has an in-edge from and an out-edge to the network in the edgelist
+                if not len(self.reg_): return np.zeros(k,dtype=bool)
+                inedges = sub_present[:,self.src_] & new[:,self.tgt_]
+                outedges = new[:,self.src_] & sub_present[:,self.tgt_]
+                new &= self._ends(inedges,self.tgt_) & self._ends(outedges,self.src_)
+            node = self._choose(new,self.nodeweights_)
+            ok = node >= 0
+            node = np.maximum(node,0)
+        if self.edgelist_ and not self.anonymous_:
+            inedge = self._choose(inedges & (self.tgt_[np.newaxis] == node[:,np.newaxis]),self.edgeweights_)
+            outedge = self._choose(outedges & (self.src_[np.newaxis] == node[:,np.newaxis]),self.edgeweights_)
+            innode, inreg = self.src_[inedge], self.reg_[inedge]
+            outnode, outreg = self.tgt_[outedge], self.reg_[outedge]
+        else:
+            # the in-edge can be an activating self-edge
+            withself = np.concatenate([sub_present,np.ones((k,1),dtype=bool)],axis=1)
+            innode = self._choose(withself)
+            selfedge = innode == len(self.labels_)
+            innode = np.where(selfedge,node,innode)
+            inreg = np.where(selfedge,1,randomreg())
+            outnode = self._choose(sub_present)
+            outreg = randomreg()
+            ok &= outnode >= 0
+        good = np.flatnonzero(ok)
+        present[idx[good],node[good]] = True
+        adj[idx[good],innode[good],node[good]] = inreg[good]
+        adj[idx[good],node[good],outnode[good]] = outreg[good]
+        if self.selfloops_:
+            adj[idx[good],node[good],node[good]] = 1
+        return ok
+
+    def _satisfied(self, adj):
+        # which candidates only changed the starting network in allowed ways and have every required edge
+        if self.unreachable_: return np.zeros(len(adj),dtype=bool)
+        L = len(self.labels_)
+        changed = adj != self.adjacency_[np.newaxis]
+        allowed = self.changeable_[np.arange(L)[:,np.newaxis],np.arange(L)[np.newaxis],adj.astype(int)+1]
+        ok = ~(changed & ~allowed).any(axis=(1,2))
+        for (u,v,reg) in self.required_:
+            ok &= adj[:,u,v] == reg
+        return ok
+
+    def _drawValid(self, rows, draw, valid, allvalid, k, weights=None):
+        # choose among the valid choices for each row in rows (uniformly, or in proportion to weights if draw does too),
+        # or -1 if there are none (also for rows not given)
+        # a few rounds of drawing at random and keeping the valid draws are usually enough; the rest are chosen exactly
+        choice = -np.ones(k,dtype=int)
+        pending = rows
+        for attempt in range(MAXDRAWS):
+            if not len(pending): return choice
+            drawn = draw(pending)
+            good = valid(pending,drawn)
+            choice[pending[good]] = drawn[good]
+            pending = pending[~good]
+        if len(pending):
+            choice[pending] = self._choose(allvalid(pending),weights)
+        return choice
+
+    def _ends(self, edges, ends):
+        # for each row of the boolean array edges over the edgelist, which slots are the ends (an array of slots by edge)
+        # of its True entries; only the True entries are visited
+        rows, cols = np.nonzero(edges)
+        hasend = np.zeros((len(edges),len(self.labels_)),dtype=bool)
+        hasend[rows,ends[cols]] = True
+        return hasend
+
+    def _choose(self, mask, weights=None):
+        # for each row of the boolean array mask, the column of a random True entry, or -1 if there are none
+        # entries are equally likely, or weighted by the array weights (one per column)
+        if weights is None:
+            counts = mask.sum(1)
+            r = (self.random_.random_sample(len(mask))*counts).astype(int)
+            choice = (np.cumsum(mask,axis=1) > r[:,np.newaxis]).argmax(1)
+        else:
+            cumulative = np.cumsum(mask*weights,axis=1)
+            counts = cumulative[:,-1] if cumulative.shape[1] else np.zeros(len(mask))
+            r = self.random_.random_sample(len(mask))*counts
+            choice = (cumulative > r[:,np.newaxis]).argmax(1)
+        return np.where(counts > 0,choice,-1)
+
+    def _screen(self, adj, present, survivors, stats):
+        # parameter counts from the logic files, as in parametercount.ParameterCountGraph
+        # return which candidates are computable and have at most maxparams parameters
+        L = len(self.labels_)
+        numact = (adj == 1).sum(1)
+        numrep = (adj == -1).sum(1)
+        numout = (adj != 0).sum(2)
+        codes = (numact*(L+1)+numrep)*(L+1)+numout
+        unique, inverse = np.unique(codes,return_inverse=True)
+        table = np.empty(len(unique))
+        for k,code in enumerate(unique):
+            numa, rest = divmod(int(code),(L+1)**2)
+            numr, numo = divmod(rest,L+1)
+            factor = parametercount.countNodeParameters(self.logicpath_,numa,numr,numo)
+            table[k] = np.nan if factor is None else factor
+        factors = np.where(present,table[inverse].reshape(codes.shape),1.0)
+        noncomputable = np.isnan(factors).any(1)
+        toolarge = ~noncomputable & (np.prod(np.where(np.isnan(factors),1.0,factors),axis=1) > self.maxparams_)
+        if stats:
+            stats.record('noncomputable',int((survivors & noncomputable).sum()))
+            stats.record('maxparams',int((survivors & toolarge).sum()))
+        return ~noncomputable & ~toolarge
+
+    def _networkSpecs(self, adj, present, survivors, stats):
+        # canonical network specs of the candidates in survivors; candidates with identical arrays are only made once
+        specs = []
+        made = set()
+        for b in survivors:
+            key = adj[b].tostring()+present[b].tostring()
+            if key in made:
+                if stats: stats.record('duplicate')
+                continue
+            made.add(key)
+            slots = np.flatnonzero(present[b])
+            graph = intervalgraph.Graph()
+            for v,slot in enumerate(slots):
+                graph.add_vertex(v,label=self.labels_[slot])
+            edges = adj[b][np.ix_(slots,slots)]
+            for u,v in zip(*np.nonzero(edges)):
+                graph.add_edge(int(u),int(v),label='a' if edges[u,v] > 0 else 'r')
+            specs.append(intervalgraph.createCanonicalNetworkSpecFromGraph(graph,self.numfixed_,self.anonymous_))
+        return specs
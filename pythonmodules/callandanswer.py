@@ -1,6 +1,7 @@
 import os,sys
 import DSGRN
-import readline, glob
+import parametercount
+import readline, glob, multiprocessing
 
 ###########################################################
 # set up tab completion for terminal entry
@@ -39,6 +40,32 @@ def gimme_nonneg_int(inputstr,strictlypositive=False):
 
     return myint
 
+def gimme_nonneg_int_skipOK(inputstr):
+    if inputstr == "":
+        return None
+    else:
+        return gimme_nonneg_int(inputstr)
+
+def gimme_size_distribution(inputstr):
+
+    errormessage = "\nResponse not recognized. Please enter maxsize:fraction pairs with increasing maxsize and fractions summing to at most 1, or leave blank.  "
+
+    success=False
+    while not success:
+        if inputstr.strip() == "":
+            return None
+        try:
+            distribution = [ (int(pair.split(':')[0]),float(pair.split(':')[1])) for pair in inputstr.split() ]
+            sizes, fractions = zip(*distribution)
+            if list(sizes) == sorted(set(sizes)) and min(fractions) >= 0 and sum(fractions) <= 1:
+                success = True
+            else:
+                inputstr = raw_input(errormessage)
+        except:
+            inputstr = raw_input(errormessage)
+
+    return distribution
+
 def gimme_positive_or_minusone_float(inputstr):
 
     errormessage = "\nResponse not recognized. Please enter a positive truncation time or -1 for no truncation.  "
@@ -99,13 +126,16 @@ def gimme_existing_path_skipOK(inputstr,isfile=False):
     else:
         return gimme_existing_path(inputstr,isfile)
 
-def gimme_computable_network(inputstr):   
+def gimme_computable_network(inputstr,logicpath=None):   
 
     errormessage = "\nProvided network is not computable. Enter another network file.  "
 
     def computable(inputstr):
         with open(inputstr,'r') as networkfile:
             network_spec = networkfile.read() 
+        # missing logic files can be detected without building the parameter graph
+        if logicpath and os.path.isdir(logicpath) and parametercount.estimateParameterCount(network_spec,logicpath) is None:
+            return False
         network=DSGRN.Network()
         try:
             network.assign(network_spec)
@@ -143,12 +173,24 @@ def getinfo():
         params['networkfolder'] = gimme_existing_path(raw_input("\nEnter the path of the network perturbations folder (each file name must have a unique integer).  "),isfile=False)
     elif netfolder == 'n':
         # perturbations are not pre-calculated
-        params['networkfile'] = gimme_computable_network(gimme_existing_path(raw_input("\nEnter the path to a network specification file.  "),isfile=True))
+        params['networkfile'] = gimme_computable_network(gimme_existing_path(raw_input("\nEnter the path to a network specification file.  "),isfile=True),parametercount.getLogicPath(params['dsgrn']))
+        shuffle = gimme_str_from_list(raw_input("\nMake degree-preserving shuffles of the network for a null model instead of perturbations (y or n)?  "),['y','n'])
+    if netfolder == 'n' and shuffle == 'y':
+        # shuffles keep every node's in- and out-degree and every edge's regulation
+        params['numshuffles'] = gimme_nonneg_int(raw_input("\nHow many network shuffles do you want? Example: 1000.  " ),strictlypositive=True)
+        params['maxparams'] = gimme_nonneg_int(raw_input("\nHow many parameters will you admit per shuffled network? Example: 1000000.  "),strictlypositive=True)
+        params['time_to_wait'] = gimme_nonneg_int(raw_input("\nHow many seconds will you wait for the network shuffles to complete? Example: 300. "),strictlypositive=True)
+        params['seed'] = gimme_nonneg_int_skipOK(raw_input("\nEnter an integer random seed to make the shuffles reproducible (leave blank otherwise). "))
+    elif netfolder == 'n':
         # get node and edge files
         nodefile = gimme_existing_path_skipOK( raw_input("\nEnter the path to a file with nodes to add (leave blank otherwise).  ") , isfile=True)
-        if nodefile: params['nodefile'] = nodefile
+        if nodefile:
+            params['nodefile'] = nodefile
+            params['nodeweightcolumn'] = gimme_nonneg_int_skipOK(raw_input("\nWhich column of the node file has weights for choosing nodes? The node name is column 0 (leave blank to choose nodes equally often).  "))
         edgefile = gimme_existing_path_skipOK(raw_input("\nEnter the path to a file with edges to add (leave blank otherwise).  "),isfile=True)
-        if edgefile: params['edgefile'] = edgefile
+        if edgefile:
+            params['edgefile'] = edgefile
+            params['edgeweightcolumn'] = gimme_nonneg_int_skipOK(raw_input("\nWhich column of the edge file has weights for choosing edges, e.g. LEM scores? The edge (TARGET = TYPE_REG(SOURCE)) is column 0, with or without spaces around the = (leave blank to choose edges equally often).  "))
         if 'edgefile' not in params and 'nodefile' not in params:
             params['add_madeup_nodes'] = gimme_str_from_list(raw_input("\nAdd anonymous nodes to the network (y or n).  "),['y','n'])
         if 'edgefile' in params and 'nodefile' not in params:
@@ -159,12 +201,30 @@ def getinfo():
             params['swap_edge_reg'] = False
         else:
             params['swap_edge_reg'] = True
+        # structural constraints applied while perturbing
+        params['immutablenodes'] = raw_input("\nEnter the names of nodes whose inputs must not change, separated by spaces (leave blank otherwise).  ").split()
+        if 'nodefile' in params or params.get('add_madeup_nodes') == 'y':
+            params['selfloops'] = gimme_str_from_list(raw_input("\nGive every added node an activating self-edge (y or n)?  "),['y','n'])
         # how many perturbations
         params['numperturbations'] = gimme_nonneg_int(raw_input("\nHow many network perturbations do you want? Example: 1000.  " ),strictlypositive=True)
         params['maxadditionspergraph'] = gimme_nonneg_int(raw_input("\nWhat is the maximum number of edge/node perturbations you will permit per graph? Example: 10. "),strictlypositive=True)
+        params['enumerate'] = gimme_str_from_list(raw_input("\nConstruct every perturbation within this many additions instead of sampling at random (y or n)? Recommended only for small node/edge lists. "),['y','n'])
+        if params['enumerate'] == 'n':
+            params['adaptive'] = gimme_str_from_list(raw_input("\nFavor the numbers and kinds of additions that are most often accepted (y or n)? This speeds up sampling, but skews which perturbations are found. "),['y','n'])
         # limit computations
         params['maxparams'] = gimme_nonneg_int(raw_input("\nHow many parameters will you admit per perturbation? Example: 1000000.  "),strictlypositive=True)
+        params['parambudget'] = gimme_nonneg_int_skipOK(raw_input("\nHow many parameters will you admit in total, summed over all networks? Perturbation stops when they are spent or there are enough perturbations. Example: 100000000 (leave blank for no total). "))
+        if params['parambudget']:
+            params['sizedistribution'] = gimme_size_distribution(raw_input("\nEnter the share of the total for each network size as maxsize:fraction pairs. Example: 10000:0.5 1000000:0.5 (leave blank for any size). "))
         params['time_to_wait'] = gimme_nonneg_int(raw_input("\nHow many seconds will you wait for the network perturbations to complete? Example: 300. "),strictlypositive=True)
+        params['numprocesses'] = gimme_nonneg_int(raw_input("\nHow many processes should generate network perturbations at the same time? This machine has {} cores. Example: 1. ".format(multiprocessing.cpu_count())),strictlypositive=True)
+        # reproducible and sharded runs
+        params['seed'] = gimme_nonneg_int_skipOK(raw_input("\nEnter an integer random seed to make the perturbations reproducible (leave blank otherwise). "))
+        if params['seed'] is not None:
+            params['shard'] = gimme_nonneg_int(raw_input("\nEnter the shard number of this run, so that runs with the same seed on different machines make different perturbations. Example: 0. "))
+        # reuse perturbations saved by earlier runs
+        catalog = raw_input("\nEnter the path to a perturbation catalog file to reuse and save network perturbations; it is created if it does not exist (leave blank otherwise). ").strip()
+        if catalog: params['catalog'] = os.path.expanduser(catalog)
 
     # choose database queries to perform; more can be added in a modular fashion
     # QUERYFILE IS EXTREME SECURITY RISK. FIX!!!
@@ -189,6 +249,8 @@ def getinfo():
 
     params['removeDB'] = gimme_str_from_list(raw_input("\nRemove database after query is complete (y or n)? Recommended answer is 'y'. "),['y','n'])
     params['removeNF'] = gimme_str_from_list(raw_input("\nRemove network file after query is complete (y or n)? Recommended answer is 'y' (network is stored in results). "),['y','n'])
+    if netfolder == 'n':
+        params['storedeltas'] = gimme_str_from_list(raw_input("\nStore each network in the results as its changes from the starting network, which are much smaller than whole networks (y or n)? The starting network is saved once in family.txt. "),['y','n'])
     return params
 
 if __name__ == '__main__':
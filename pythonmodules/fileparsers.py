@@ -95,6 +95,57 @@ def parseNodeFile(fname):
                 nodelist.append(wordlist[0])
     return nodelist
 
+def parseEdgeFileWithWeights(fname,weightcolumn=1):
+    ''' Returns a list of (source, target, regulation) edges and a dictionary of edge weights keyed by edge.
+    File format is the same as for parseEdgeFile. The weight of an edge is the number in column weightcolumn
+    (the edge itself is column 0, with or without spaces around the =), for example a LEM score. Weights must
+    not be negative.
+    
+    '''
+    edgelist = parseEdgeFile(fname)
+    weights = dict( (edge,weight) for edge,weight in zip(edgelist,_parseWeightColumn(fname,weightcolumn,edges=True)) )
+    return edgelist, weights
+
+def parseNodeFileWithWeights(fname,weightcolumn=1):
+    ''' Returns a list of nodes from the file and a dictionary of node weights keyed by node.
+    File format is the same as for parseNodeFile. The weight of a node is the number in column weightcolumn
+    (the node itself is column 0). Weights must not be negative.
+    
+    '''
+    nodelist = parseNodeFile(fname)
+    weights = dict( (node,weight) for node,weight in zip(nodelist,_parseWeightColumn(fname,weightcolumn)) )
+    return nodelist, weights
+
+def _parseWeightColumn(fname,weightcolumn,edges=False):
+    # the numbers in column weightcolumn of the data lines, in the format of parseEdgeFile (if edges) or parseNodeFile
+    # lines are split as in parseEdgeFile, where an edge TARGET = TYPE_REG(SOURCE) is two words, and counted as column 0
+    weights = []
+    with open(fname,'r') as f:
+        for l in f.readlines():
+            if l:
+                if l[0] == '#':
+                    continue
+                if edges:
+                    weight = float(l.replace(',',' ').replace('=',' ').split()[weightcolumn+1])
+                else:
+                    weight = float(l.replace(',',' ').split()[weightcolumn])
+                if weight < 0:
+                    raise ValueError("Negative weight in {}: {}".format(fname,l.strip()))
+                weights.append(weight)
+    return weights
+
+
+def test():
+    # edge weights are read the same way with and without spaces around the =
+    import tempfile, os
+    for lines in [ "# edge score\nY = a(X) 0.5\nX = r(Y) 2\n", "# edge score\nY=a(X) 0.5\nX=r(Y),2\n" ]:
+        fd,fname = tempfile.mkstemp()
+        with os.fdopen(fd,'w') as f:
+            f.write(lines)
+        edgelist,weights = parseEdgeFileWithWeights(fname)
+        os.remove(fname)
+        print edgelist == [('X','Y','a'),('Y','X','r')] and weights == {('X','Y','a') : 0.5, ('Y','X','r') : 2.0}
+
 
 if __name__ == '__main__':
     pass
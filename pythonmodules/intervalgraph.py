@@ -1,52 +1,88 @@
 #!/usr/bin/python
 
-import subprocess, copy, json
-from collections import defaultdict
+import subprocess, json, itertools, bisect, string, operator, math
+from collections import defaultdict, OrderedDict
 
 ################################
 # Directed Acyclic Graph Class #
 ################################
 
-class Graph:
+class Graph(object):
+  """ A directed graph with labelled vertices and edges.
+      Vertices are indexed by label, and in-edges are kept as well as out-edges, so that finding a vertex by its label,
+      the predecessors of a vertex, and the transpose are cheap. Copies made by clone() and transpose() share the
+      adjacency sets with the original until either graph changes them (copy on write).
+  """
+  __slots__ = ('vertices_', 'vertex_labels_', 'label_index_', 'successors_', 'predecessors_', 'edge_labels_',
+               'reversed_', 'shared_', 'owned_')
   def __init__(self):
     """ Initialize an empty graph object """
     self.vertices_ = set()
-    self.adjacency_lists_ = {}
     self.vertex_labels_ = {}
+    self.label_index_ = {}
+    self.successors_ = {}
+    self.predecessors_ = {}
+    # edge labels keyed by (u,v), or by (v,u) in a transposed copy (reversed_)
     self.edge_labels_ = {}
+    self.reversed_ = False
+    # shared_ means the tables are shared with a copy; owned_ is the set of vertices whose adjacency sets this graph
+    # may change in place, or None for all of them
+    self.shared_ = False
+    self.owned_ = None
   def add_vertex(self, v, label = ''):
     """ Add the vertex v to the graph and associate a label if one is given """
     if v in self.vertices_: return
+    if self.shared_: self._unshare()
     self.vertices_.add(v)
-    self.adjacency_lists_[v] = set ()
     self.vertex_labels_[v] = label
-    self.edge_labels_[v] = {}
+    self.label_index_.setdefault(label,set()).add(v)
+    self.successors_[v] = set()
+    self.predecessors_[v] = set()
+    if self.owned_ is not None: self.owned_.add(v)
   def add_edge(self, u, v, label = ''):
     """ Add the edge u -> v to the graph and associate a label if one is given """
-    self.add_vertex(u)
-    self.add_vertex(v)
-    self.adjacency_lists_[u].add(v)
-    self.edge_labels_[u][v] = label
+    if u not in self.vertices_: self.add_vertex(u)
+    if v not in self.vertices_: self.add_vertex(v)
+    if self.shared_: self._unshare()
+    if self.owned_ is not None: self._own(u,v)
+    self.successors_[u].add(v)
+    self.predecessors_[v].add(u)
+    self.edge_labels_[(v,u) if self.reversed_ else (u,v)] = label
   def remove_edge(self, u, v):
     """ Remove the edge u -> v from the graph """
-    self.adjacency_lists_[u].discard(v)
-    self.edge_labels_[u].pop(v, None)
+    if v not in self.successors_[u]: return
+    if self.shared_: self._unshare()
+    if self.owned_ is not None: self._own(u,v)
+    self.successors_[u].discard(v)
+    self.predecessors_[v].discard(u)
+    self.edge_labels_.pop((v,u) if self.reversed_ else (u,v), None)
+  def remove_vertex(self, v):
+    """ Remove the vertex v and any edges to or from it """
+    for u in list(self.predecessors_[v]): self.remove_edge(u,v)
+    for u in list(self.successors_[v]): self.remove_edge(v,u)
+    if self.shared_: self._unshare()
+    self.vertices_.discard(v)
+    label = self.vertex_labels_.pop(v)
+    self.label_index_[label].discard(v)
+    if not self.label_index_[label]: del self.label_index_[label]
+    del self.successors_[v]
+    del self.predecessors_[v]
+    if self.owned_ is not None: self.owned_.discard(v)
   def vertex_label(self, v):
     """ Return the label on the vertex v """
     return self.vertex_labels_[v]
   def get_vertex_from_label(self, label):
     """ Return the vertex v with label 'label'. Error if non-unique. """
-    vertices = [ v for v in self.vertices_ if self.vertex_label(v) == label ]
-    N = len(vertices)
-    if N == 1:
-      return vertices[0]
-    elif N==0:
+    vertices = self.label_index_.get(label)
+    if not vertices:
       return None
-    elif N>1:
+    elif len(vertices) == 1:
+      return next(iter(vertices))
+    else:
       raise ValueError("Non-unique vertex labels.")
   def edge_label(self, u, v):
     """ Return the label on the edge u -> v """
-    return self.edge_labels_[u][v]
+    return self.edge_labels_[(v,u) if self.reversed_ else (u,v)]
   def vertices(self):
     """ Return the set of vertices in the graph """
     return self.vertices_
@@ -55,33 +91,95 @@ class Graph:
     return [(u,v) for u in self.vertices() for v in self.adjacencies(u)]
   def adjacencies(self, v):
     """ Return the set of adjacencies of v, i.e. { u : v -> u } """
-    return self.adjacency_lists_[v]
+    return self.successors_[v]
+  def predecessors(self, v):
+    """ Return the set { u : u -> v } """
+    return self.predecessors_[v]
   def clone(self):
     """ Return a copy of this graph """
-    return copy.deepcopy(self)
+    return self._copy(False)
   def transpose(self):
     """ Return a new graph with edge direction reversed. """
-    G = Graph ()
-    for v in self.vertices(): G.add_vertex(v,self.vertex_label(v))
-    for (u,v) in self.edges(): G.add_edge(v,u,self.edge_label(u,v))
+    return self._copy(True)
+  def _copy(self, transpose):
+    """ Return a copy of this graph, transposed if transpose, that shares its tables until either graph changes """
+    G = self.__class__.__new__(self.__class__)
+    G.vertices_ = self.vertices_
+    G.vertex_labels_ = self.vertex_labels_
+    G.label_index_ = self.label_index_
+    G.successors_ = self.predecessors_ if transpose else self.successors_
+    G.predecessors_ = self.successors_ if transpose else self.predecessors_
+    G.edge_labels_ = self.edge_labels_
+    G.reversed_ = self.reversed_ != transpose
+    G.shared_ = self.shared_ = True
+    G.owned_ = set()
+    self.owned_ = set()
     return G
+  def _unshare(self):
+    """ Copy the tables shared with another graph before they are changed; the adjacency sets are copied when
+        each is changed (see _own) """
+    self.vertices_ = set(self.vertices_)
+    self.vertex_labels_ = dict(self.vertex_labels_)
+    self.label_index_ = dict( (label,set(vertices)) for label,vertices in self.label_index_.items() )
+    self.successors_ = dict(self.successors_)
+    self.predecessors_ = dict(self.predecessors_)
+    self.edge_labels_ = dict(self.edge_labels_)
+    self.shared_ = False
+  def _own(self, *vertices):
+    """ Copy the adjacency sets of the vertices that may be shared with another graph, before they are changed """
+    for v in vertices:
+      if v not in self.owned_:
+        self.successors_[v] = set(self.successors_[v])
+        self.predecessors_[v] = set(self.predecessors_[v])
+        self.owned_.add(v)
+  def __getstate__(self):
+    """ Pickled state, including the attributes of subclasses without slots """
+    return (self.vertices_, self.vertex_labels_, self.label_index_, self.successors_, self.predecessors_, self.edge_labels_,
+            self.reversed_, getattr(self,'__dict__',None))
+  def __setstate__(self, state):
+    (self.vertices_, self.vertex_labels_, self.label_index_, self.successors_, self.predecessors_, self.edge_labels_,
+     self.reversed_, attributes) = state
+    if attributes: self.__dict__.update(attributes)
+    # graphs pickled together come back sharing whatever tables they shared (pickle keeps the aliasing), so an
+    # unpickled graph copies its tables on the first change, as a fresh copy does
+    self.shared_ = True
+    self.owned_ = set()
   def transitive_closure(self):
-    """ Return a new graph which is the transitive closure """
+    """ Return a new graph which is the transitive closure.
+        Edges u -> v that lie on a path of two or more edges get the label '', the others keep their labels. """
+    vertices, reach, twostep = self._reachability()
     G = self.clone ()
-    for w in self.vertices():
-      for u in self.vertices():
-        for v in self.vertices():
-          if w in G.adjacencies(u) and v in G.adjacencies(w):
-            G . add_edge(u,v)
+    for k,u in enumerate(vertices):
+      for j in _bits(reach[k]):
+        v = vertices[j]
+        G.add_edge(u,v,'' if twostep[k] >> j & 1 else self.edge_label(u,v))
     return G
   def transitive_reduction(self):
-    """ Return a new graph which is the transitive reduction """
-    TC = self.transitive_closure ()
+    """ Return a new graph which is the transitive reduction, i.e. without the edges that lie on a path of two or more edges """
+    vertices, reach, twostep = self._reachability()
     G = self.clone ()
-    for (u,v) in TC.edges():
-      for w in TC.adjacencies(v):
-        G.remove_edge(u,w)
+    for k,u in enumerate(vertices):
+      for j in _bits(twostep[k]):
+        G.remove_edge(u,vertices[j])
     return G
+  def _reachability(self):
+    """ Return the vertices as a list and, as integer bitsets over its positions, the vertices reachable from each by
+        paths of one or more edges and by paths of two or more edges """
+    vertices = list(self.vertices())
+    index = dict( (v,k) for k,v in enumerate(vertices) )
+    adjacent = [ sum(1 << index[v] for v in self.adjacencies(u)) for u in vertices ]
+    # Warshall's algorithm, one bitset operation per pair of vertices
+    reach = list(adjacent)
+    for j in range(len(vertices)):
+      bit, through = 1 << j, reach[j]
+      for k in range(len(vertices)):
+        if reach[k] & bit: reach[k] |= through
+    twostep = []
+    for k in range(len(vertices)):
+      paths = 0
+      for j in _bits(adjacent[k]): paths |= reach[j]
+      twostep.append(paths)
+    return vertices, reach, twostep
   def graphviz(self):
     """ Return a graphviz string describing the graph and its labels """
     gv = 'digraph {\n'
@@ -90,57 +188,153 @@ class Graph:
     for (u,v) in self.edges(): gv += indices[u] + ' -> ' + indices[v] + ' [label="' + self.edge_label(u,v) + '"];\n'
     return gv + '}\n'
 
+def _bits(bitset):
+  """ Iterate over the positions of the ones in the integer bitset """
+  while bitset:
+    low = bitset & -bitset
+    yield low.bit_length() - 1
+    bitset ^= low
+
 ###############################
 # Partially Ordered Set Class #
 ###############################
 
-class Poset:
+class Poset(object):
   def __init__(self, graph):
-    """  Create a Poset P from a DAG G such that x <= y in P iff there is a path from x to y in G """
-    self.vertices_ = set(graph.vertices())
-    self.descendants_ = graph.transitive_closure()
-    self.ancestors_ = self.descendants_.transpose()
-    self.children_ = graph.transitive_reduction()
-    self.parents_ = self.children_.transpose()
+    """  Create a Poset P from a DAG G such that x <= y in P iff there is a path from x to y in G.
+         Each element is given a bit position, and sets of elements are kept as integer bitmasks. """
+    elements, reach, twostep = graph._reachability()
+    self.elements_ = elements
+    self.index_ = dict( (v,k) for k,v in enumerate(elements) )
+    self.vertices_ = set(elements)
+    adjacent = [ self.mask(graph.adjacencies(v)) for v in elements ]
+    self.descendants_ = reach
+    self.ancestors_ = self._transpose(reach)
+    self.children_ = [ a & ~t for a,t in zip(adjacent,twostep) ]
+    self.parents_ = self._transpose(self.children_)
   def vertices(self):
     """ Return the set of elements in the poset """
     return self.vertices_
   def parents(self, v):
     """ Return the immediate predecessors of v in the poset """
-    return self.parents_.adjacencies(v)
+    return self.elements(self.parents_[self.index_[v]])
   def children(self, v):
     """ Return the immediate successors of v in the poset """
-    return self.children_.adjacencies(v)
+    return self.elements(self.children_[self.index_[v]])
   def ancestors(self, v):
     """ Return the set { u : u < v } """
-    return self.ancestors_.adjacencies(v)
+    return self.elements(self.ancestors_[self.index_[v]])
   def descendants(self, v):
     """ Return the set { u : v < u } """
-    return self.descendants_.adjacencies(v)
+    return self.elements(self.descendants_[self.index_[v]])
   def less(self, u, v):
     """ Return True if u < v, False otherwise """
-    return u in self.ancestors(v)
+    return bool(self.descendants_[self.index_[u]] >> self.index_[v] & 1)
   def maximal(self, subset):
     """ Return the set of elements in "subset" which are maximal """
-    return frozenset({ u for u in subset if not any ( self.less(u,v) for v in subset ) })
+    return frozenset(self.elements(self.maximal_mask(self.mask(subset))))
+  def mask(self, subset):
+    """ Return the bitmask of the elements in subset """
+    mask = 0
+    for v in subset: mask |= 1 << self.index_[v]
+    return mask
+  def elements(self, mask):
+    """ Return the set of elements in the bitmask mask """
+    return set( self.elements_[k] for k in _bits(mask) )
+  def element(self, k):
+    """ Return the element with bit position k """
+    return self.elements_[k]
+  def parents_mask(self, k):
+    """ Return the bitmask of the immediate predecessors of the element with bit position k """
+    return self.parents_[k]
+  def ancestors_mask(self, k):
+    """ Return the bitmask of { u : u < v } for the element v with bit position k """
+    return self.ancestors_[k]
+  def maximal_mask(self, mask):
+    """ Return the bitmask of the maximal elements in the bitmask mask """
+    maximal = 0
+    for k in _bits(mask):
+      if not self.descendants_[k] & mask: maximal |= 1 << k
+    return maximal
+  def _transpose(self, masks):
+    """ Return the bitmasks of the relation given by masks with its direction reversed """
+    transposed = [0]*len(masks)
+    for k,mask in enumerate(masks):
+      for j in _bits(mask): transposed[j] |= 1 << k
+    return transposed
 
 ###################################
 # Poset-to-PatternGraph Algorithm #
 ###################################
 
-def PosetToPatternGraph(poset):
-  """ Generate from poset the Hasse diagram of the poset of down-sets of "poset" ordered by inclusion """
+def PosetToPatternGraph(poset, maxvertices=None):
+  """ Generate from poset the Hasse diagram of the poset of down-sets of "poset" ordered by inclusion.
+      Return None instead if it has more than maxvertices vertices (see CountPatternGraph to check first). """
+  # a down-set is represented by the bitmask of its maximal elements, and becomes a frozenset vertex only once
+  cliques = {}
+  def clique(mask):
+    if mask not in cliques: cliques[mask] = frozenset(poset.elements(mask))
+    return cliques[mask]
   pattern_graph = Graph()
-  recursion_stack = [poset.maximal(poset.vertices())]
+  top = poset.maximal_mask(poset.mask(poset.vertices()))
+  visited = set([top])
+  recursion_stack = [top]
   while recursion_stack:
-    clique = recursion_stack.pop()
-    for v in clique:
-      parent_clique = poset.maximal(clique.difference([v]).union(poset.parents(v)))
-      if parent_clique not in pattern_graph.vertices():
-        recursion_stack.append (parent_clique)
-      pattern_graph.add_edge (parent_clique,clique, str(v))
+    mask = recursion_stack.pop()
+    for k in _bits(mask):
+      parent_mask = poset.maximal_mask((mask & ~(1 << k)) | poset.parents_mask(k))
+      if parent_mask not in visited:
+        if maxvertices is not None and len(visited) >= maxvertices: return None
+        visited.add(parent_mask)
+        recursion_stack.append (parent_mask)
+      pattern_graph.add_edge (clique(parent_mask),clique(mask), str(poset.element(k)))
   return pattern_graph
 
+def CountPatternGraph(poset, maxvertices=None):
+  """ Return the numbers of vertices and edges of PosetToPatternGraph(poset) without building it,
+      or None if there are more than maxvertices vertices. Memory use does not grow with the pattern graph. """
+  numvertices, numedges = 0, 0
+  for downset, maximal in _downsets(poset):
+    numvertices += 1
+    if maxvertices is not None and numvertices > maxvertices: return None
+    numedges += bin(maximal).count('1')
+  return numvertices, numedges
+
+def StreamPatternGraph(poset, fname, maxvertices=None):
+  """ Write the edges of PosetToPatternGraph(poset) to the file fname as they are found, one JSON line
+      [parent vertex, child vertex, label] per edge, with each vertex as a sorted list of poset elements.
+      Return the numbers of vertices and edges, or None if there are more than maxvertices vertices, in which case
+      the file is incomplete. Memory use does not grow with the pattern graph. """
+  numvertices, numedges = 0, 0
+  with open(fname,'w') as f:
+    for downset, maximal in _downsets(poset):
+      numvertices += 1
+      if maxvertices is not None and numvertices > maxvertices: return None
+      clique = sorted(poset.elements(maximal))
+      for k in _bits(maximal):
+        parent_mask = poset.maximal_mask((maximal & ~(1 << k)) | poset.parents_mask(k))
+        f.write(json.dumps([sorted(poset.elements(parent_mask)),clique,str(poset.element(k))])+'\n')
+        numedges += 1
+  return numvertices, numedges
+
+def _downsets(poset):
+  """ Iterate over the down-sets of poset as (down-set, maximal elements) pairs of bitmasks, each exactly once.
+      The down-sets are found by reverse search: the parent of a down-set is the down-set without its maximal element
+      of highest bit position, so only the down-sets next to the current branch are held in memory, and none have to
+      be remembered to avoid visiting them twice. An empty poset has no down-sets, as its pattern graph has no vertices. """
+  if not poset.vertices(): return
+  everything = poset.mask(poset.vertices())
+  stack = [(0,0)]
+  while stack:
+    downset, maximal = stack.pop()
+    yield downset, maximal
+    for k in _bits(everything & ~downset):
+      if poset.parents_mask(k) & ~downset: continue
+      # adding k keeps the maximal elements that are not below k, and k must have the highest bit position among them
+      others = maximal & ~poset.ancestors_mask(k)
+      if others < (1 << k):
+        stack.append((downset | (1 << k), others | (1 << k)))
+
 ###################################
 # Create Interval Graph from Data #
 ###################################
@@ -163,6 +357,41 @@ def IntervalGraph(events):
         G.add_edge(i,j)
   return G
 
+def ReducedIntervalGraph(events):
+  """ Return the transitive reduction (Hasse diagram) of IntervalGraph(events) without building the interval graph.
+      The events are sorted by the start of their intervals, and for each event u the events covering it are the ones
+      starting at or after the end of u and before the earliest end among all such events (other than themselves), which
+      is a contiguous run in the sorted order. This takes O(N log N) time plus the number of edges.
+      Two single-point intervals at the same point are ordered both ways in IntervalGraph, so for those events the
+      reduction of IntervalGraph(events) is returned instead.
+  """
+  N = len(events)
+  starts = [ events[i][1][0] for i in range(N) ]
+  ends = [ events[i][1][1] for i in range(N) ]
+  points = [ starts[i] for i in range(N) if starts[i] == ends[i] ]
+  if len(points) != len(set(points)):
+    return IntervalGraph(events).transitive_reduction()
+  order = sorted(range(N), key=lambda i : starts[i])
+  sortedstarts = [ starts[i] for i in order ]
+  # earliest[k] holds the three smallest (end, event) among the events order[k:], enough to leave out both u and v
+  earliest = [[]]*(N+1)
+  for k in range(N-1,-1,-1):
+    earliest[k] = sorted(earliest[k+1] + [(ends[order[k]],order[k])])[:3]
+  G = Graph()
+  for i in range(0, N):
+    G.add_vertex(i,events[i][0])
+  for u in range(0, N):
+    first = bisect.bisect_left(sortedstarts, ends[u])
+    # (end, event) of the two earliest ending events after u, other than u itself
+    (m1,a1), (m2,_) = ([ e for e in earliest[first] if e[1] != u ] + [(float('inf'),None)]*2)[:2]
+    # every event starting before m1 covers u, and the event a1 ending at m1 covers u when it starts before m2
+    last = bisect.bisect_left(sortedstarts, m1, first)
+    for k in range(first, last):
+      if order[k] != u: G.add_edge(u,order[k])
+    if a1 is not None and starts[a1] >= m1 and starts[a1] < m2:
+      G.add_edge(u,a1)
+  return G
+
 
 ##################################################
 # Translation to and from network specifications
@@ -179,51 +408,149 @@ def sort_by_list(X,Y,reverse=False):
 
 def createEssentialNetworkSpecFromGraph(graph):
     # take a graph and return a network spec file
+    # nodes are written in the order of their vertices, and the inputs of each node in the order of theirs
+    vertices = sorted(graph.vertices())
+    names = dict( (v,graph.vertex_label(v)) for v in vertices )
+    lines = []
+    for v in vertices:
+        act, rep = [], []
+        for u in sorted(graph.predecessors(v)):
+            reg = graph.edge_label(u,v)
+            if reg == 'a': act.append(names[u])
+            elif reg == 'r': rep.append("(~" + names[u] + ")")
+        lines.append(names[v] + " : " + ("(" + " + ".join(act) + ")" if act else "") + "".join(rep) + " : E\n")
+    return "".join(lines)
+
+def createCanonicalNetworkSpecFromGraph(graph,numfixed,anonymous=True):
+    # take a graph and return a network spec file that is the same for every graph differing only in the order
+    # in which the vertices numfixed, numfixed+1, ... were added
+    # vertices 0,...,numfixed-1 (e.g. the starting network) keep their positions
+    # if anonymous, the added vertices have made-up labels and are interchangeable, so they are ordered by how they
+    # are connected to the rest of the graph; otherwise they are ordered by label
+    added = sorted([ v for v in graph.vertices() if v >= numfixed ])
+    if anonymous:
+        order = _canonicalOrder(graph,added,numfixed)
+        labels = [ graph.vertex_label(v) for v in added ]
+    else:
+        order = sorted(added,key=graph.vertex_label)
+        labels = [ graph.vertex_label(v) for v in order ]
+    position = dict( (v,v) for v in graph.vertices() if v < numfixed )
+    position.update( (v,numfixed+k) for k,v in enumerate(order) )
+    canonical = Graph()
+    for v in range(numfixed):
+        canonical.add_vertex(v,label=graph.vertex_label(v))
+    for k,label in enumerate(labels):
+        canonical.add_vertex(numfixed+k,label=label)
+    for (u,v) in graph.edges():
+        canonical.add_edge(position[u],position[v],label=graph.edge_label(u,v))
+    return createEssentialNetworkSpecFromGraph(canonical)
+
+# most orders of the added vertices that _canonicalOrder tries before it gives up on a canonical order
+CANONICALSEARCHLIMIT = 5040
+
+def _canonicalOrder(graph,added,numfixed):
+    # order the interchangeable vertices in added (which are numbered from numfixed) so that isomorphic graphs give the same order
+    # first split the vertices into classes by color refinement, then break ties inside the classes by
+    # taking the permutation with the smallest edge list (classes are almost always singletons)
+    addedset = set(added)
+    inedges = dict( (v,[]) for v in added )
+    outedges = dict( (v,[]) for v in added )
+    for (u,v) in graph.edges():
+        if v in addedset: inedges[v].append((u,graph.edge_label(u,v)))
+        if u in addedset: outedges[u].append((v,graph.edge_label(u,v)))
+
+    def rank(signatures):
+        ranks = dict( (sig,k) for k,sig in enumerate(sorted(set(signatures.values()))) )
+        return dict( (v,ranks[sig]) for v,sig in signatures.items() )
 
-    # get network nodes in order
-    networknodeindices,networknodenames = zip(*[(v,graph.vertex_label(v)) for v in graph.vertices()])
-    [networknodeindices,networknodenames] = sort_by_list(networknodeindices,[networknodenames],reverse=False)
-
-    # get inedges
-    graph_edges = [ (v,a,graph.edge_label(v,a)) for v in graph.vertices() for a in graph.adjacencies(v) ] 
-    inedges=[[] for _ in range(len(networknodenames))]
-    for edge in graph_edges:
-        inedges[edge[1]].append((edge[0],edge[2]))
-
-    # generate network spec
-    network_spec = ""  
-    for (node,ies) in zip(networknodenames,inedges):
-        act = " + ".join([networknodenames[i] for (i,r) in ies if r == 'a'])
-        if act:
-            act = "(" + act  + ")"
-        rep = "".join(["(~"+networknodenames[i]+")" for (i,r) in ies if r == 'r'])
-        nodestr = node + " : " + act + rep + " : E\n"
-        network_spec += nodestr
-    return network_spec
+    # initial colors come from the edges to and from the fixed vertices and any self-loop
+    color = rank(dict( (v,( tuple(sorted( e for e in inedges[v] if e[0] not in addedset )),
+                            tuple(sorted( e for e in outedges[v] if e[0] not in addedset )),
+                            graph.edge_label(v,v) if v in graph.adjacencies(v) else '' )) for v in added ))
+    while True:
+        newcolor = rank(dict( (v,( color[v],
+                                   tuple(sorted( (color[u],r) for (u,r) in inedges[v] if u in addedset )),
+                                   tuple(sorted( (color[w],r) for (w,r) in outedges[v] if w in addedset )) )) for v in added ))
+        if len(set(newcolor.values())) == len(set(color.values())): break
+        color = newcolor
+
+    # vertices with the same in- and out-edges (so none between them, but maybe self-loops) can be swapped without
+    # changing the graph, so only the order of these groups of twins inside a class matters, and the twins are kept in
+    # the order of added
+    def neighbours(v,edges):
+        return frozenset( (None if u == v else u,r) for (u,r) in edges )
+    twins = defaultdict(list)
+    for v in added:
+        twins[(color[v],neighbours(v,inedges[v]),neighbours(v,outedges[v]))].append(v)
+    classes = defaultdict(list)
+    for key in sorted(twins,key=lambda key : twins[key][0]):
+        classes[key[0]].append(twins[key])
+    classes = [ classes[c] for c in sorted(classes) ]
+    if reduce(operator.mul,[ math.factorial(len(c)) for c in classes ],1) > CANONICALSEARCHLIMIT:
+        # too many orders to try; keep the groups in the order of added, so isomorphic graphs may get different orders
+        return [ v for c in classes for group in c for v in group ]
+    best = None
+    for perms in itertools.product(*[ itertools.permutations(c) for c in classes ]):
+        order = [ v for perm in perms for group in perm for v in group ]
+        position = dict( (v,numfixed+k) for k,v in enumerate(order) )
+        key = sorted( (position.get(u,u),position.get(v,v),graph.edge_label(u,v)) for (u,v) in graph.edges() if u in addedset or v in addedset )
+        if best is None or key < best[0]:
+            best = (key,order)
+    return best[1] if best else []
+
+# number of parsed network specs kept by getGraphFromNetworkSpec
+NETWORKSPECCACHESIZE = 1024
+
+_graph_cache = OrderedDict()
+
+# characters that separate the words of a network spec line, for str and unicode lines
+_separators = string.maketrans('()+*','    ')
+_unicode_separators = dict( (ord(c),u' ') for c in '()+*' )
 
 def getGraphFromNetworkSpec(network_spec):
     # take a network spec and return an intervalgraph.Graph
-    eqns = filter(bool,network_spec.split("\n"))
+    # the graphs of the last NETWORKSPECCACHESIZE network specs are kept, and a copy of the kept graph is returned
+    # (copies share the graph's tables until they are changed, so this is cheap, and changing the copy is safe)
+    graph = _graph_cache.pop(network_spec,None)
+    if graph is None:
+        graph = _parseNetworkSpec(network_spec)
+        if len(_graph_cache) >= NETWORKSPECCACHESIZE:
+            _graph_cache.popitem(last=False)
+    _graph_cache[network_spec] = graph
+    return graph.clone()
+
+def _parseNetworkSpec(network_spec):
+    # the graph of a network spec; node k is the vertex k, labelled with its name
+    separators = _unicode_separators if isinstance(network_spec,unicode) else _separators
     nodelist = []
     innodes = []
-    for l in eqns:
-        words = l.replace('(',' ').replace(')',' ').replace('+',' ').replace('*',' ').split()
+    for l in network_spec.split("\n"):
+        words = l.translate(separators).split()
+        if not words: continue
         if words[-2:] == [':', 'E']:
             words = words[:-2]
         nodelist.append(words[0])
         innodes.append(words[2:]) # get rid of ':' at index 1
+    # the tables of the graph are filled in directly, which is much faster than adding the vertices and edges one by one
+    N = len(nodelist)
+    index = {}
     graph = Graph()
-    for k,node in enumerate(nodelist): # need the index as node name to preserve original network order in perturbed networks
-        graph.add_vertex(k,label=node)
+    graph.vertices_ = set(range(N)) # need the index as node name to preserve original network order in perturbed networks
+    graph.vertex_labels_ = dict(enumerate(nodelist))
+    graph.successors_ = dict( (k,set()) for k in range(N) )
+    graph.predecessors_ = dict( (k,set()) for k in range(N) )
+    for k,node in enumerate(nodelist):
+        graph.label_index_.setdefault(node,set()).add(k)
+        index.setdefault(node,k)
     for outnode,ies in enumerate(innodes):
         for ie in ies:
-            if ie[0] == '~':
-                ie = ie[1:]
-                reg = 'r'
-            else:
-                reg = 'a'
-            innode = nodelist.index(ie)
-            graph.add_edge(innode,outnode,label=reg)
+            reg = 'r' if ie[0] == '~' else 'a'
+            innode = index.get(ie[1:] if reg == 'r' else ie)
+            if innode is None:
+                raise ValueError("Unknown node " + ie + " in network spec.")
+            graph.successors_[innode].add(outnode)
+            graph.predecessors_[outnode].add(innode)
+            graph.edge_labels_[(innode,outnode)] = reg
     return graph
 
 # ##############
@@ -251,11 +578,10 @@ def getGraphFromNetworkSpec(network_spec):
 # #        the (i+D)th bit is 1 if the final state is increasing in variable i
 # label = 0b10100000101111   # variables 0,1,2,3,5 decreasing, variables 4,6 increasing
 
-# # Create the interval graph
-# G = IntervalGraph(events)
+# # Create the Hasse diagram of the interval graph
+# HasseDiagram = ReducedIntervalGraph(events)
 
 # # Produce a JSON file suitable for the C++ pattern matching program
-# HasseDiagram = G.transitive_reduction();
 # output = {}
 # output["poset"] = [ list(HasseDiagram.adjacencies(i)) for i in HasseDiagram.vertices() ]
 # output["events"] = [ genes.index(HasseDiagram.vertex_label(i)) for i in HasseDiagram.vertices() ]
@@ -1,6 +1,6 @@
 from callandanswer import getinfo
 import networkperturbations as perturb
-import fileparsers,ExtremaPO
+import fileparsers,ExtremaPO,perturbationfamily
 import subprocess, os, json, itertools,sys
 
 
@@ -18,14 +18,21 @@ class Job():
             self.params = getinfo()
         else:
             self.params = params
+        # set by _makedirectories when networks are stored as deltas
+        self.FAMILYFILE = ""
 
     def prep(self):
         # set up folders for calculations
         self._makedirectories()
-        # do perturbations if not already done
+        # do perturbations (or shuffles for a null model) if not already done
         if 'numperturbations' in self.params:
             self._parsefilesforperturbation()
             networks = perturb.perturbNetwork(self.params)
+        elif 'numshuffles' in self.params:
+            # networkshuffles needs numpy, so it is only imported for shuffles
+            import networkshuffles
+            self._parsefilesforperturbation()
+            networks = networkshuffles.shuffleNetwork(self.params)
         else:
             networks = None
         # make patterns if desired and not already done
@@ -37,14 +44,49 @@ class Job():
         # save networks and patterns, if any
         self._savefiles(networks,patterns,uids)
 
-    def run(self):
+    def stream(self):
+        # same as prep() followed by run(), except that each network perturbation is saved and handed to the scheduler
+        # (or run, if "local") as soon as it is made, so that database computations start before the perturbations finish
+        if 'numperturbations' in self.params:
+            networks = perturb.iterPerturbations
+            N=len(str(self.params['numperturbations']+1))
+        elif 'numshuffles' in self.params:
+            import networkshuffles
+            networks = networkshuffles.iterShuffles
+            N=len(str(self.params['numshuffles']+1))
+        else:
+            self.prep()
+            self.run()
+            return
+        self._makedirectories()
+        self._parsefilesforperturbation()
+        patterns = {}
+        for k,network_spec in enumerate(networks(self.params)):
+            # zero pad integer for unique id
+            uid = str(k).zfill(N)
+            nfile = self._savenetwork(uid,network_spec)
+            if self.FAMILYFILE:
+                # the first network is the seed network
+                if k == 0: family = perturbationfamily.FamilyWriter(self.FAMILYFILE,network_spec)
+                family.add(uid,network_spec)
+            if 'timeseriesfile' in self.params:
+                # networks with the same nodes share patterns
+                networklabels = self._makenetworklabelsfromspecs([network_spec])[0][0]
+                if networklabels not in patterns:
+                    patterns[networklabels] = self._makepatterns([network_spec])[1][0]
+                self._savepatterns(uid,patterns[networklabels])
+            self.run(nfile)
+        if self.FAMILYFILE: family.close()
+
+    def run(self,networkfile=None):
         # shell call to scheduler (or serial if "local")
+        # runs every network in self.NETWORKDIR, or only networkfile if given
         if self.params['removeDB'] == 'y': RMDB = "True"
         else: RMDB = "False"
         if self.params['removeNF'] == 'y': RMNF = "True"
         else: RMNF = "False"
         if not self.params['queryfile']: self.params['queryfile'] = 'shellscripts/blankquery.sh'
-        shellcall = ["shellscripts/networkperturbations.sh " + " ".join([self.params['dsgrn'],self.NETWORKDIR,self.PATTERNDIR, self.DATABASEDIR, self.RESULTSDIR, self.params['queryfile'],"shellscripts/networkperturbations_helper_"+self.run_type+".sh",self.run_type, RMDB, RMNF])]
+        shellcall = ["shellscripts/networkperturbations.sh " + " ".join([self.params['dsgrn'],networkfile or self.NETWORKDIR,self.PATTERNDIR, self.DATABASEDIR, self.RESULTSDIR, self.params['queryfile'],"shellscripts/networkperturbations_helper_"+self.run_type+".sh",self.run_type, RMDB, RMNF, self.FAMILYFILE or "None"])]
         subprocess.call(shellcall,shell=True)
 
     def _makedirectories(self):
@@ -65,6 +107,12 @@ class Job():
             self.PATTERNDIR =os.path.join(path,"patterns")
             subprocess.call(['mkdir -p ' + self.PATTERNDIR],shell=True)
 
+        # results store each network as its delta from the seed network in the family file, if requested
+        if self.params.get('storedeltas') == 'y' and 'networkfolder' not in self.params:
+            self.FAMILYFILE = os.path.join(path,"family.txt")
+        else:
+            self.FAMILYFILE = ""
+
         self.DATABASEDIR=os.path.join(path,"databases")
         self.RESULTSDIR =os.path.join(path,"results")
         subprocess.call(['mkdir -p ' + self.DATABASEDIR],shell=True)
@@ -74,11 +122,15 @@ class Job():
         network_spec = open(self.params['networkfile'],'r').read()
         while network_spec[-1]=='\n': network_spec = network_spec[:-1]
         self.params['network_spec'] = network_spec
-        if 'edgefile' in self.params:
+        if 'edgefile' in self.params and self.params.get('edgeweightcolumn'):
+            self.params['edgelist'],self.params['edgeweights'] = fileparsers.parseEdgeFileWithWeights(self.params['edgefile'],self.params['edgeweightcolumn'])
+        elif 'edgefile' in self.params:
             self.params['edgelist'] = fileparsers.parseEdgeFile(self.params['edgefile'])
         else:
             self.params['edgelist'] = None
-        if 'nodefile' in self.params:
+        if 'nodefile' in self.params and self.params.get('nodeweightcolumn'):
+            self.params['nodelist'],self.params['nodeweights'] = fileparsers.parseNodeFileWithWeights(self.params['nodefile'],self.params['nodeweightcolumn'])
+        elif 'nodefile' in self.params:
             self.params['nodelist'] = fileparsers.parseNodeFile(self.params['nodefile'])
         else:
             self.params['nodelist'] = None
@@ -122,32 +174,33 @@ class Job():
         labels,data = zip(*[(node,TSList[TSLabels.index(node)][:ind]) for node in TSLabels if node in desiredlabels])
         return labels,data
 
-    def _savefiles(self,networks=None,patterns=None,networkuids=None):
+    def _savenetwork(self,uid,network_spec):
+        nfile = os.path.join(self.NETWORKDIR, "network"+uid+".txt")
+        open(nfile,'w').write(network_spec)
+        return nfile
 
-        def savenetwork(uid,network_spec):
-            nfile = os.path.join(self.NETWORKDIR, "network"+uid+".txt")
-            open(nfile,'w').write(network_spec)
+    def _savepatterns(self,uid,pats):
+        scfc_padding = max(max([len(str(s)) for s in self.params['scaling_factors']])-2, 0)
+        subdir = os.path.join(self.PATTERNDIR,uid)
+        subprocess.call(['mkdir -p ' + subdir],shell=True)
+        for (pat,scfc) in zip(pats,self.params['scaling_factors']):
+            puid = '{:.{prec}f}'.format(scfc, prec=scfc_padding).replace('.','_')
+            pfile = os.path.join(subdir, "pattern"+puid+".txt")
+            json.dump(pat,open(pfile,'w'))
 
-        def savepatterns(uid,pats):
-            subdir = os.path.join(self.PATTERNDIR,uid)
-            subprocess.call(['mkdir -p ' + subdir],shell=True)
-            for (pat,scfc) in zip(pats,self.params['scaling_factors']):
-                puid = '{:.{prec}f}'.format(scfc, prec=scfc_padding).replace('.','_')
-                pfile = os.path.join(subdir, "pattern"+puid+".txt")
-                json.dump(pat,open(pfile,'w'))
+    def _savefiles(self,networks=None,patterns=None,networkuids=None):
 
         if patterns is not None:
-            scfc_padding = max(max([len(str(s)) for s in self.params['scaling_factors']])-2, 0)
             if networks is not None:
                 N=len(str(len(networks)))
                 for k,(network_spec,pats) in enumerate(zip(networks,patterns)):
                     # zero pad integer for unique id
                     uid = str(k).zfill(N)
-                    savenetwork(uid,network_spec)
-                    savepatterns(uid,pats)
+                    self._savenetwork(uid,network_spec)
+                    self._savepatterns(uid,pats)
             elif networkuids is not None:
                 for (uid,pats) in zip(networkuids,patterns):
-                    savepatterns(uid,pats)
+                    self._savepatterns(uid,pats)
             else:
                 raise RuntimeError("Should not get here. Debug.")
         elif networks is not None:
@@ -155,6 +208,16 @@ class Job():
             for k,network_spec in enumerate(networks):
                 # zero pad integer for unique id
                 uid = str(k).zfill(N)
-                savenetwork(uid,network_spec)
+                self._savenetwork(uid,network_spec)
+        if networks is not None and self.FAMILYFILE:
+            self._savefamily(networks)
+
+    def _savefamily(self,networks):
+        # the first network is the seed network; uids are the same as the network file names
+        N=len(str(len(networks)))
+        family = perturbationfamily.FamilyWriter(self.FAMILYFILE,networks[0])
+        for k,network_spec in enumerate(networks):
+            family.add(str(k).zfill(N),network_spec)
+        family.close()
        
         
\ No newline at end of file
@@ -0,0 +1,151 @@
+import hashlib, string, re
+import intervalgraph
+
+#####################################################################################################################
+# Compact binary encoding of networks, for use as dictionary and database keys and for sending networks between
+# processes. The encoding is canonical: two network specs with the same nodes (in the same order), the same signed
+# edges and the same essential flags have the same encoding, however their inputs are ordered or spaced. As in
+# intervalgraph, all activating inputs of a node are summed in one factor and each repressing input is a factor of its
+# own, which is the logic of the specs it writes; the encoding has no room for other groupings, so specs that use them
+# are refused rather than confused with this one.
+#
+# Layout (numbers are unsigned LEB128 varints):
+#   format version (one byte)
+#   number of nodes N, then for each node the length of its name and the name in UTF-8
+#   essential flags, one bit per node, in (N+7)/8 bytes
+#   for each node, the number of its inputs, then each input as 2*source+1 if repressing, 2*source if activating,
+#   in increasing order
+#####################################################################################################################
+
+FORMAT_VERSION = 1
+
+# characters that separate the words of a network spec line, as in intervalgraph.getGraphFromNetworkSpec
+_separators = string.maketrans('()+*','    ')
+_unicode_separators = dict( (ord(c),u' ') for c in '()+*' )
+
+# the inputs of a node as intervalgraph writes them: repressing factors of one input each, and at most one factor of
+# activating inputs (which may go without parentheses), in any order
+_repressing = r'\s*\*?\s*\(\s*~[^\s()+*~]+\s*\)'
+_grouping = re.compile(r'(?:{0})*\s*\*?\s*(?:\([^()~]*\)|[^()~*]*)(?:{0})*\s*$'.format(_repressing),re.UNICODE)
+
+def encodeNetworkSpec(network_spec):
+    # return the encoding of a DSGRN network spec; raises ValueError if the inputs of a node are grouped into factors
+    # any other way than intervalgraph writes them
+    # the spec is read here, the same way as in intervalgraph.getGraphFromNetworkSpec, because building a graph first
+    # would make this several times slower
+    separators = _unicode_separators if isinstance(network_spec,unicode) else _separators
+    nodes = []
+    for l in network_spec.split("\n"):
+        words = l.translate(separators).split()
+        if not words: continue
+        if not _grouping.match(l.split(":")[1]):
+            raise ValueError("Network spec line with factors the encoding can't represent: " + l)
+        essential = words[-2:] == [':', 'E']
+        nodes.append((words[0],words[2:-2] if essential else words[2:],essential))
+    index = {}
+    for k,(name,_,_) in enumerate(nodes):
+        index.setdefault(name,k)
+    N = len(nodes)
+    code = bytearray([FORMAT_VERSION])
+    _putVarint(code,N)
+    flags = bytearray((N+7)//8)
+    for v,(name,_,essential) in enumerate(nodes):
+        if isinstance(name,unicode): name = name.encode('utf-8')
+        _putVarint(code,len(name))
+        code.extend(name)
+        if essential: flags[v//8] |= 1 << (v%8)
+    code.extend(flags)
+    for name,words,_ in nodes:
+        try:
+            inputs = sorted(set( 2*index[w[1:]]+1 if w[0] == '~' else 2*index[w] for w in words ))
+        except KeyError:
+            raise ValueError("Unknown node in network spec.")
+        _putVarint(code,len(inputs))
+        for i in inputs: _putVarint(code,i)
+    return str(code)
+
+def encodeGraph(graph,essential=None):
+    # return the encoding of an intervalgraph.Graph with vertices 0,...,N-1 and edges labelled 'a' or 'r'
+    # essential is a list of flags by vertex; by default every node is essential
+    N = len(graph.vertices())
+    if essential is None: essential = [True]*N
+    code = bytearray([FORMAT_VERSION])
+    _putVarint(code,N)
+    for v in range(N):
+        name = graph.vertex_label(v)
+        if isinstance(name,unicode): name = name.encode('utf-8')
+        _putVarint(code,len(name))
+        code.extend(name)
+    flags = bytearray((N+7)//8)
+    for v in range(N):
+        if essential[v]: flags[v//8] |= 1 << (v%8)
+    code.extend(flags)
+    for v in range(N):
+        inputs = sorted( 2*u+(graph.edge_label(u,v) == 'r') for u in graph.predecessors(v) )
+        _putVarint(code,len(inputs))
+        for i in inputs: _putVarint(code,i)
+    return str(code)
+
+def decodeGraph(code):
+    # return the intervalgraph.Graph of an encoding and its list of essential flags by vertex
+    code = bytearray(code)
+    if code[0] != FORMAT_VERSION:
+        raise ValueError("Unknown network encoding version " + str(code[0]) + ".")
+    pos = 1
+    N, pos = _getVarint(code,pos)
+    graph = intervalgraph.Graph()
+    for v in range(N):
+        length, pos = _getVarint(code,pos)
+        graph.add_vertex(v,label=str(code[pos:pos+length]))
+        pos += length
+    essential = [ bool(code[pos+v//8] >> (v%8) & 1) for v in range(N) ]
+    pos += (N+7)//8
+    for v in range(N):
+        numinputs, pos = _getVarint(code,pos)
+        for _ in range(numinputs):
+            i, pos = _getVarint(code,pos)
+            graph.add_edge(i >> 1,v,label='r' if i & 1 else 'a')
+    return graph, essential
+
+def decodeNetworkSpec(code):
+    # return the network spec of an encoding, written as intervalgraph.createEssentialNetworkSpecFromGraph writes it
+    # (nodes without the essential flag lose their ': E')
+    graph, essential = decodeGraph(code)
+    lines = intervalgraph.createEssentialNetworkSpecFromGraph(graph).split("\n")
+    return "\n".join( l if l == "" or essential[v] else l[:-len(" : E")] for v,l in enumerate(lines) )
+
+def encodingHash(code):
+    # stable content hash (hexadecimal SHA-1) of an encoding
+    return hashlib.sha1(code).hexdigest()
+
+def _putVarint(code,n):
+    while n > 127:
+        code.append(n & 127 | 128)
+        n >>= 7
+    code.append(n)
+
+def _getVarint(code,pos):
+    n, shift = 0, 0
+    while code[pos] & 128:
+        n |= (code[pos] & 127) << shift
+        shift += 7
+        pos += 1
+    return n | code[pos] << shift, pos+1
+
+
+def test():
+    # specs that differ only in the order and spacing of inputs have the same encoding, and factor groupings that the
+    # encoding can't tell apart are refused
+    code = encodeNetworkSpec("A : (A + B)(~C) : E\nB : (A) : E\nC : (~B) : E")
+    print code == encodeNetworkSpec("A : (~C)(B+A) : E\nB : A : E\n\nC : (~B) : E\n")
+    print decodeNetworkSpec(code) == "A : (A + B)(~C) : E\nB : (A) : E\nC : (~B) : E\n"
+    for spec in ["A : (A)(B) : E\nB : (A) : E", "A : (A + ~B) : E\nB : (A) : E", "A : (~A + ~B) : E\nB : (A) : E"]:
+        try:
+            encodeNetworkSpec(spec)
+            print False
+        except ValueError:
+            print True
+
+
+if __name__ == "__main__":
+    test()
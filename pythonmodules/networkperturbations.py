@@ -1,13 +1,15 @@
-import random, itertools
+import random, itertools, multiprocessing
 import DSGRN
-import intervalgraph
-import time
+import intervalgraph, parametercount, perturbationcatalog, networkencoding
+import time, os, hashlib, bisect
+from collections import defaultdict
 
 #####################################################################################################################
-# Library for perturbing networks. The method perturbNetworks is expected to be the only externally called function.
+# Library for perturbing networks. The methods perturbNetwork, iterPerturbations (its streaming version), and
+# mergePerturbations (combines sharded runs) are expected to be the only externally called functions.
 #####################################################################################################################
 
-def perturbNetwork(params):
+def perturbNetwork(params,stats=None):
     # params is a dictionary with the following key,value pairs: 
     # network_spec : DSGRN format json string
     # edgelist : a list of ("source","target","regulation") tuples OR None OR empty list
@@ -17,85 +19,1068 @@ def perturbNetwork(params):
     # add_madeup_nodes :  'y' or 'n'; add anonymous nodes to network (no nodelist supplied, but want nodes added)
     # maxparams : integer > 0; parameters per database are allowed (eventually this should be deprecated for estimated db time calculation)
     # maxiterations : integer > 0; how many times can a single perturbation be added to a network (failures are possible, overestimate)
+    # numprocesses : (optional) integer > 0; number of worker processes generating perturbations at the same time (default 1)
+    # enumerate : (optional) 'y' or 'n'; walk every network within maxadditionspergraph additions instead of sampling (default 'n')
+    # logicpath : (optional) path to the DSGRN logic files used to screen candidates before checking them in DSGRN
+    #             (default is share/DSGRN/logic in the folder params['dsgrn'], when given)
+    # seed : (optional) integer; makes the perturbations reproducible (default None, seeded from system entropy)
+    # shard : (optional) integer >= 0; picks one of many independent random streams for the same seed, so that several
+    #         machines can make perturbations of the same network at once; combine their results with mergePerturbations (default 0)
+    # adaptive : (optional) 'y' or 'n'; favor the numbers of additions and the node or edge additions that are most often
+    #            accepted (default 'n'); this speeds up sampling when few attempts are accepted, but skews which networks are found
+    # edgeweights : (optional) dictionary of weights keyed by edgelist edges; edges are drawn in proportion to their weights (default equal)
+    # nodeweights : (optional) dictionary of weights keyed by nodelist nodes; nodes are drawn in proportion to their weights (default equal)
+    # requirededges : (optional) list of ("source","target","regulation") edges that every perturbation must have;
+    #                 the ones between nodes of network_spec are added to the starting network
+    # forbiddenedges : (optional) list of ("source","target","regulation") edges that are never added
+    # immutablenodes : (optional) list of node labels whose in-edges are never added to or changed
+    # selfloops : (optional) 'y' or 'n'; every added node gets an activating self-edge (default 'n')
+    # parambudget : (optional) integer > 0; the total number of parameters over all of the networks, including the starting network;
+    #               perturbation stops when it is spent, or numperturbations are made, whichever is first
+    # sizedistribution : (optional) list of (maxsize,fraction) pairs with increasing maxsize; with parambudget, fraction of the budget
+    #                    is spent on networks with at most maxsize parameters and more than the previous maxsize (default [(maxparams,1.0)])
+    # batchsize : (optional) integer > 0; make candidates batchsize at a time as numpy arrays (see batchperturbations; requires numpy)
+    #             instead of one at a time; the adaptive and numprocesses options are not used
+    # catalog : (optional) path to a perturbationcatalog SQLite file; networks already made from this network_spec with the same
+    #           settings (and at most maxparams parameters) are reused, only the shortfall is made, and new networks are saved there
+    # stats is an optional PerturbationStats instance that is filled with the outcomes of the attempted perturbations
+
+    # Return however many networks were made
+    return list(iterPerturbations(params,stats))
+
+def iterPerturbations(params,stats=None):
+    # same as perturbNetwork, but yields each network spec as soon as it is accepted, starting with the starting network spec
+    # time spent by the caller in between network specs does not count toward time_to_wait
+    if stats is None: stats = PerturbationStats()
+    constraints = getConstraints(params)
+    if constraints or params.get('parambudget'):
+        # the copy of params is changed below
+        params = dict(params)
+    if constraints:
+        # forbidden edges and edges into immutable nodes are never drawn from the edgelist
+        params['edgelist'] = constraints.filter_edges(params['edgelist'])
+    if params.get('parambudget'):
+        budget = ParameterBudget(params['parambudget'],params.get('sizedistribution') or [(int(params['maxparams']),1.0)])
+        # the samplers read maxparams as they go, so maxparams is lowered to what is left of the budget
+        maxparams = int(params['maxparams'])
+    else:
+        budget = None
 
     # reset random seed for every run
-    random.seed()
+    random.seed(getRandomSeed(params))
 
-    # make starting graph, make sure network_spec is essential, and add network_spec to list of networks
-    starting_graph = intervalgraph.getGraphFromNetworkSpec(params['network_spec'])
+    # make starting graph, make sure network_spec is essential, and yield it first
+    starting_graph = makeStartingGraph(params)
+    if constraints: constraints.apply(starting_graph)
     network_spec = intervalgraph.createEssentialNetworkSpecFromGraph(starting_graph)
-    networks = [network_spec]
+    # network specs are in canonical form, so a set lookup catches isomorphic duplicates
+    seen = set([network_spec])
 
-    # Set a timer for the while loop, which can be infinite if numperturbations is too large for maxparams
-    start_time = time.time()
-    current_time = time.time()-start_time
+    # Set a timer for the search, which can be infinite if numperturbations is too large for maxparams
+    stopwatch = Stopwatch()
+
+    # networks already made from this seed network with the same settings
+    seed_spec = network_spec
+    if params.get('catalog'):
+        catalog = perturbationcatalog.PerturbationCatalog(params['catalog'])
+        family = catalog.register(params)
+        if catalog.paramcount(seed_spec) is None:
+            catalog.add(seed_spec,getParameterCount(seed_spec),seed_spec,family)
+        reused = catalog.networks(seed_spec,family,params['maxparams'],None if budget else params['numperturbations'])
+        seen.update(spec for spec,paramcount in reused)
+    else:
+        catalog = None
+        reused = []
+    if budget:
+        budget.spend(getParameterCount(seed_spec) or 0)
+
+    def withinbudget(paramcount,generated=True):
+        # spend the budget on a network with paramcount parameters, if it fits
+        # the samplers have already counted generated networks as accepted
+        if not budget: return True
+        if not budget.fits(paramcount):
+            if generated: stats.record('accepted',-1)
+            stats.record('budget')
+            return False
+        budget.spend(paramcount)
+        params['maxparams'] = min(maxparams,budget.largest())
+        return True
+
+    def finished():
+        return count == params['numperturbations']+1 or (budget and budget.spent())
 
     # now make perturbations
-    while (len(networks) < params['numperturbations']+1) and (current_time < params['time_to_wait']): 
-        # explicitly copy so that original graph is unchanged
-        graph = starting_graph.clone()
+    if params.get('enumerate','n') == 'y':
+        perturbations = enumeratePerturbations(starting_graph,seen,params,stopwatch,stats,set( spec for spec,paramcount in reused ))
+    elif params.get('batchsize'):
+        perturbations = samplePerturbationsInBatches(starting_graph,seen,params,stopwatch,stats)
+    elif params.get('numprocesses',1) > 1:
+        perturbations = samplePerturbationsInParallel(starting_graph,seen,params,stopwatch,stats)
+    else:
+        perturbations = samplePerturbations(starting_graph,seen,params,stopwatch,stats)
+
+    count = 1
+    stopwatch.pause()
+    try:
+        yield network_spec
+        for network_spec,paramcount in reused:
+            if finished(): break
+            if withinbudget(paramcount,generated=False):
+                count += 1
+                yield network_spec
+        stopwatch.resume()
+        if not finished():
+            for network_spec,paramcount in perturbations:
+                stopwatch.pause()
+                if catalog: catalog.add(network_spec,paramcount,seed_spec,family)
+                if withinbudget(paramcount):
+                    count += 1
+                    yield network_spec
+                stopwatch.resume()
+                if finished(): break
+    finally:
+        # shuts down worker processes, if any
+        perturbations.close()
+        if catalog: catalog.close()
+        if stopwatch.paused_ is not None: stopwatch.resume()
+        stats.elapsed = stopwatch.elapsed()
+    if stopwatch.elapsed() > params['time_to_wait']:
+        print "Network perturbation timed out. Proceeding with {} perturbations.".format(count)
+        print stats.report()
+    elif budget and budget.spent():
+        print "Parameter budget spent. Proceeding with {} perturbations.".format(count)
+
+class ParameterBudget(object):
+    # a total number of parameters split among bins of network sizes
+    # distribution is a list of (maxsize,fraction) pairs with increasing maxsize; fraction of budget is for the networks
+    # with at most maxsize parameters and more than the previous maxsize
+    def __init__(self,budget,distribution):
+        self.bounds_ = [ maxsize for maxsize,fraction in distribution ]
+        self.room_ = [ budget*fraction for maxsize,fraction in distribution ]
+        self.smallest_ = None
+
+    def bin(self,paramcount):
+        # the bin for paramcount, or None if it is larger than every maxsize
+        k = bisect.bisect_left(self.bounds_,paramcount)
+        return k if k < len(self.bounds_) else None
+
+    def fits(self,paramcount):
+        k = self.bin(paramcount)
+        return k is not None and paramcount <= self.room_[k]
+
+    def spend(self,paramcount):
+        k = self.bin(paramcount)
+        if k is not None: self.room_[k] -= paramcount
+        if paramcount and (self.smallest_ is None or paramcount < self.smallest_): self.smallest_ = paramcount
+
+    def largest(self):
+        # the most parameters that a network could have and still fit
+        return max([0]+[ min(bound,room) for bound,room in zip(self.bounds_,self.room_) ])
+
+    def spent(self):
+        # true when no bin has room for a network as small as the smallest one so far
+        return all( room < (self.smallest_ or 1) for room in self.room_ )
+
+def getRandomSeed(params,*stream):
+    # seed of the random stream for params['seed'] and params['shard'], or None when there is no seed
+    # extra arguments pick a substream, e.g. one per worker process; hashing keeps nearby seeds and shards uncorrelated
+    if params.get('seed') is None: return None
+    key = ":".join(str(k) for k in (params['seed'],params.get('shard',0))+stream)
+    return int(hashlib.sha1(key).hexdigest(),16)
+
+def mergePerturbations(shards):
+    # shards is a list of outputs of perturbNetwork for the same network made with different shards
+    # return one list of the distinct network specs, starting with the starting network spec
+    merged = []
+    seen = set()
+    for networks in shards:
+        for network_spec in networks:
+            if network_spec not in seen:
+                seen.add(network_spec)
+                merged.append(network_spec)
+    return merged
+
+class Stopwatch(object):
+    # seconds spent generating perturbations, not counting the time in between pause() and resume()
+    def __init__(self):
+        self.start_ = time.time()
+        self.paused_ = None
+    def pause(self):
+        self.paused_ = time.time()
+    def resume(self):
+        self.start_ += time.time()-self.paused_
+        self.paused_ = None
+    def elapsed(self):
+        if self.paused_ is not None: return self.paused_-self.start_
+        return time.time()-self.start_
+
+class PerturbationStats(object):
+    # counts of attempted perturbations by outcome, and the seconds spent making them
+    # 'failed' means that an addition could not be made, 'maxparams' that the network has too many parameters,
+    # 'budget' that there is no room left for it in params['parambudget'], and 'constraint' that it lacks a required edge
+    outcomes = ['accepted','duplicate','maxparams','noncomputable','failed','budget','constraint']
+
+    def __init__(self):
+        self.counts = dict( (outcome,0) for outcome in self.outcomes )
+        self.elapsed = 0.0
+
+    def record(self,outcome,count=1):
+        self.counts[outcome] += count
+
+    def update(self,other):
+        # add the counts of another PerturbationStats, e.g. from a worker process
+        for outcome in self.outcomes:
+            self.counts[outcome] += other.counts[outcome]
+
+    def attempts(self):
+        return sum(self.counts.values())
+
+    def rates(self):
+        # attempts per second and accepts per second
+        if not self.elapsed: return 0.0, 0.0
+        return self.attempts()/self.elapsed, self.counts['accepted']/self.elapsed
+
+    def report(self):
+        attemptrate, acceptrate = self.rates()
+        return "Attempts: {} ({:.1f}/s). Accepted: {} ({:.1f}/s). Duplicates: {}. Too many parameters: {}. Not computable: {}. Failed additions: {}. Over budget: {}. Missing required edges: {}.".format(
+            self.attempts(),attemptrate,self.counts['accepted'],acceptrate,self.counts['duplicate'],self.counts['maxparams'],self.counts['noncomputable'],self.counts['failed'],self.counts['budget'],self.counts['constraint'])
+
+class AdaptiveChoices(object):
+    # makes the random choices of perturbNetworkWithNodesAndEdges and perturbNetworkWithEdgesOnly with probabilities
+    # proportional to how often each choice ended in an accepted perturbation; every choice starts with one success and one
+    # failure, so no choice is ever ruled out
+    # an attempt is credited to the number of additions drawn and to each kind of addition (node or edge) it made
+
+    def __init__(self,maxadditions):
+        self.maxadditions_ = maxadditions
+        # choice -> [attempts,accepts], in total and since the last call to fresh()
+        self.counts_ = defaultdict(lambda : [0,0])
+        self.new_ = defaultdict(lambda : [0,0])
+        self.current_ = set()
+
+    def numadditions(self):
+        k = self._choose([ ('additions',k) for k in range(1,self.maxadditions_+1) ])[1]
+        self.current_.add(('additions',k))
+        return k
+
+    def addedge(self):
+        kind = self._choose(['edge','node'])
+        self.current_.add(kind)
+        return kind == 'edge'
+
+    def record(self,accepted):
+        # end the current attempt
+        for choice in self.current_:
+            for counts in (self.counts_[choice],self.new_[choice]):
+                counts[0] += 1
+                counts[1] += int(accepted)
+        self.current_ = set()
+
+    def fresh(self):
+        # a copy with the same probabilities that only remembers its own attempts in new_, for use in a worker process
+        chooser = AdaptiveChoices(self.maxadditions_)
+        for choice,counts in self.counts_.items():
+            chooser.counts_[choice] = list(counts)
+        return chooser
+
+    def update(self,other):
+        # add the attempts that other made since it was made by fresh()
+        for choice,counts in other.new_.items():
+            for mine in (self.counts_[choice],self.new_[choice]):
+                mine[0] += counts[0]
+                mine[1] += counts[1]
+
+    def _choose(self,choices):
+        weights = [ (self.counts_[c][1]+1.0)/(self.counts_[c][0]+2.0) for c in choices ]
+        x = random.random()*sum(weights)
+        for c,w in zip(choices,weights):
+            x -= w
+            if x < 0: return c
+        return choices[-1]
+
+    def __getstate__(self):
+        # defaultdicts with lambdas can't be pickled
+        return (self.maxadditions_,dict(self.counts_),dict(self.new_))
+
+    def __setstate__(self,state):
+        self.__init__(state[0])
+        self.counts_.update(state[1])
+        self.new_.update(state[2])
+
+def getAdaptiveChoices(params):
+    # an AdaptiveChoices instance when params asks for one, otherwise None (the choices are uniformly random)
+    if params.get('adaptive','n') == 'y':
+        return AdaptiveChoices(params['maxadditionspergraph'])
+    return None
+
+class Constraints(object):
+    # structural constraints on perturbations from the params requirededges, forbiddenedges, immutablenodes, and selfloops
+    # (see perturbNetwork); edges are (source label, target label, regulation)
+    def __init__(self,params):
+        self.required_ = set(params.get('requirededges') or [])
+        self.forbidden_ = set(params.get('forbiddenedges') or [])
+        self.immutable_ = set(params.get('immutablenodes') or [])
+        self.selfloops_ = params.get('selfloops','n') == 'y'
+        # regulations of required edges, which can't be swapped
+        self.required_regs_ = dict( ((e[0],e[1]),e[2]) for e in self.required_ )
+
+    def __nonzero__(self):
+        return bool(self.required_ or self.forbidden_ or self.immutable_ or self.selfloops_)
+
+    def allows(self,source,target,reg):
+        # whether the edge may be added, or its regulation swapped to reg
+        if target in self.immutable_ or (source,target,reg) in self.forbidden_: return False
+        return self.required_regs_.get((source,target),reg) == reg
+
+    def filter_edges(self,edgelist):
+        if not edgelist: return edgelist
+        return [ e for e in edgelist if self.allows(*e) ]
+
+    def apply(self,graph):
+        # add the required edges between nodes of graph
+        for (source,target,reg) in self.required_:
+            u,v = graph.get_vertex_from_label(source), graph.get_vertex_from_label(target)
+            if u is not None and v is not None: graph.add_edge(u,v,reg)
+
+    def allowed_edges(self,graph,swap_edge_reg=True):
+        # the edges (source vertex, target vertex, regulation) that can be added to graph, without negative self-loops
+        labels = getNetworkLabels(graph)
+        graph_edges = getLabeledEdges(graph)
+        N = len(labels)
+        return [ (u,v,r) for u in range(N) for v in range(N) for r in 'ar' if (u != v or r == 'a') and (u,v,r) not in graph_edges
+                 and (swap_edge_reg or v not in graph.adjacencies(u)) and self.allows(labels[u],labels[v],r) ]
+
+    def add_selfloop(self,graph,v):
+        # give the added vertex v an activating self-edge if selfloops are required
+        if self.selfloops_ and v not in graph.adjacencies(v): graph.add_edge(v,v,'a')
+
+    def satisfied(self,graph):
+        # whether graph has every required edge
+        for (source,target,reg) in self.required_:
+            u,v = graph.get_vertex_from_label(source), graph.get_vertex_from_label(target)
+            if u is None or v is None or v not in graph.adjacencies(u) or graph.edge_label(u,v) != reg: return False
+        return True
+
+def getConstraints(params):
+    # a Constraints instance when params has any, otherwise None
+    constraints = Constraints(params)
+    return constraints if constraints else None
+
+def samplePerturbations(starting_graph,seen,params,stopwatch,stats):
+    # yield random perturbations and their parameter counts until time runs out; seen is the set of network specs already accepted
+    # the outcome of every attempt is recorded in the PerturbationStats stats
+    constraints = getConstraints(params)
+    working_graph = WorkingGraph(starting_graph.clone(),params['edgelist'],params['swap_edge_reg'],params['nodelist'],params.get('edgeweights'),params.get('nodeweights'),constraints)
+    chooser = getAdaptiveChoices(params)
+    while stopwatch.elapsed() < params['time_to_wait']:
+        network_spec = makePerturbation(working_graph,params,stats,chooser,constraints)
+        paramcount = checkPerturbation(network_spec,seen,params,stats)
+        if chooser: chooser.record(bool(paramcount))
+        if paramcount:
+            seen.add(network_spec)
+            stats.record('accepted')
+            yield network_spec, paramcount
+
+def samplePerturbationsInBatches(starting_graph,seen,params,stopwatch,stats):
+    # same as samplePerturbations, but candidates are made params['batchsize'] at a time by batchperturbations
+    # numpy is only needed for this, so it is imported here
+    import batchperturbations
+    batches = batchperturbations.PerturbationBatch(starting_graph,params,getRandomSeed(params,'batch'))
+    while stopwatch.elapsed() < params['time_to_wait']:
+        for network_spec in batches.sample(params['batchsize'],stats):
+            paramcount = checkPerturbation(network_spec,seen,params,stats)
+            if paramcount:
+                seen.add(network_spec)
+                stats.record('accepted')
+                yield network_spec, paramcount
+            if stopwatch.elapsed() > params['time_to_wait']: return
+
+def checkPerturbation(network_spec,known,params,stats):
+    # check that network spec from makePerturbation is unique (up to reordering of added nodes), small enough, and computable
+    # returns the parameter count if so, otherwise False; rejections are recorded in stats; makePerturbation has already recorded why network_spec is None
+    if network_spec is None:
+        return False
+    if network_spec in known:
+        stats.record('duplicate')
+        return False
+    return checkComputability(network_spec,params['maxparams'],stats)
+
+def makeStartingGraph(params):
+    # when the DSGRN logic files can be found, the graph keeps a running parameter count
+    # so that candidates can be screened without building a DSGRN.ParameterGraph
+    if 'logicpath' in params:
+        logicpath = params['logicpath']
+    elif 'dsgrn' in params:
+        logicpath = parametercount.getLogicPath(params['dsgrn'])
+    else:
+        logicpath = None
+    if logicpath and os.path.isdir(logicpath):
+        return parametercount.getParameterCountGraph(params['network_spec'],logicpath)
+    else:
+        return intervalgraph.getGraphFromNetworkSpec(params['network_spec'])
+
+def makePerturbation(working_graph,params,stats=None,chooser=None,constraints=None):
+    # make a single perturbation of the WorkingGraph working_graph and return its canonical network spec,
+    # or None if the perturbation failed or is screened out by its parameter count (the reason is recorded in stats, if given)
+    # chooser is an optional AdaptiveChoices instance, and constraints an optional Constraints instance
+    # working_graph is rolled back afterwards, so it is unchanged
+    numfixed = len(working_graph.vertices())
+    try:
         # add nodes and edges or just add edges based on params
         # this can fail, in which case None is returned
         if params['nodelist'] or (not params['edgelist'] and params['add_madeup_nodes'] == 'y'):
-            graph = perturbNetworkWithNodesAndEdges(graph,params['edgelist'],params['nodelist'],params['maxadditionspergraph'],params['swap_edge_reg'])
+            graph = perturbNetworkWithNodesAndEdges(working_graph,params['edgelist'],params['nodelist'],params['maxadditionspergraph'],params['swap_edge_reg'],chooser,constraints)
         else:
-            graph = perturbNetworkWithEdgesOnly(graph,params['edgelist'],params['maxadditionspergraph'],params['swap_edge_reg']) 
-        if graph is not None:
-            # get the perturbed network spec
-            network_spec = intervalgraph.createEssentialNetworkSpecFromGraph(graph)
-
-            # TODO: check for graph isomorphisms in added nodes (only have string matching below). 
-            # Can get nodes added in different orders with same edges. Should be rare in general, so not high priority.
-            # BUT it might be more common than you'd think, since we filter given a maximum number of parameters.
-
-            # check that network spec is all of unique (in string match, not isomorphism), small enough, and computable, then add to list
-            if (network_spec not in networks) and checkComputability(network_spec,params['maxparams']):
-                networks.append(network_spec)
-        current_time = time.time()-start_time
-    if current_time > params['time_to_wait']:
-        print "Network perturbation timed out. Proceeding with {} perturbations.".format(len(networks))
-    # Return however many networks were made
-    return networks
+            graph = perturbNetworkWithEdgesOnly(working_graph,params['edgelist'],params['maxadditionspergraph'],params['swap_edge_reg'],chooser,constraints)
+        if graph is None:
+            if stats: stats.record('failed')
+            return None
+        if constraints and not constraints.satisfied(graph):
+            if stats: stats.record('constraint')
+            return None
+        # screen out networks that are too large or missing logic files; the survivors are confirmed in DSGRN
+        if working_graph.counts_parameters():
+            paramcount = working_graph.parameter_count()
+            if paramcount is None or paramcount > int(params['maxparams']):
+                if stats: stats.record('noncomputable' if paramcount is None else 'maxparams')
+                return None
+        # get the perturbed network spec; nodes added in different orders give the same spec
+        # added nodes are interchangeable when their names are made up, and ordered by name when they come from a nodelist
+        anonymous = not params['nodelist']
+        return intervalgraph.createCanonicalNetworkSpecFromGraph(working_graph,numfixed,anonymous)
+    finally:
+        working_graph.rollback()
+
+
+#####################################################################################################################
+# A graph for making perturbations in place. Changes are logged so that they can be undone instead of copying the
+# starting graph for every perturbation. Node labels and edges are kept up to date rather than recomputed.
+#####################################################################################################################
+
+class WorkingGraph(object):
+    """ Wraps an intervalgraph.Graph (or parametercount.ParameterCountGraph) and logs every change made through
+        add_vertex and add_edge, so that rollback() returns the graph to the state it was wrapped in.
+        Other Graph methods are passed through to the wrapped graph.
+    """
+
+    def __init__(self, graph, edgelist=None, swap_edge_reg=True, nodelist=None, edgeweights=None, nodeweights=None, constraints=None):
+        # if edgelist is given, the edges from it that can be added to the graph are indexed (see CandidateEdges)
+        # otherwise, if constraints (a Constraints instance) is given, the edges they allow are indexed (see AllowedEdges)
+        # if nodelist is given, the nodes from it that can be added to the graph are indexed (see CandidateNodes)
+        # the indexes draw edges and nodes in proportion to edgeweights and nodeweights, when given
+        self.graph_ = graph
+        self.log_ = []
+        self.labels_ = [ graph.vertex_label(v) for v in sorted(graph.vertices()) ]
+        self.edges_ = set( (u,v,graph.edge_label(u,v)) for (u,v) in graph.edges() )
+        if edgelist:
+            self.edge_index_ = CandidateEdges(self,edgelist,swap_edge_reg,edgeweights)
+        elif constraints:
+            self.edge_index_ = AllowedEdges(self,constraints,swap_edge_reg)
+        else:
+            self.edge_index_ = None
+        self.node_index_ = CandidateNodes(self,nodelist,edgelist,edgeweights,nodeweights) if nodelist else None
+
+    def __getattr__(self, name):
+        return getattr(self.graph_,name)
+
+    def add_vertex(self, v, label = ''):
+        if v in self.graph_.vertices(): return
+        self.graph_.add_vertex(v,label)
+        self.log_.append((v,label))
+        self.labels_.append(label)
+        if self.edge_index_: self.edge_index_.vertex_added(v,label)
+        if self.node_index_: self.node_index_.vertex_added(v,label)
+
+    def add_edge(self, u, v, label = ''):
+        self.add_vertex(u)
+        self.add_vertex(v)
+        oldlabel = self.graph_.edge_label(u,v) if v in self.graph_.adjacencies(u) else None
+        self.graph_.add_edge(u,v,label)
+        self.log_.append((u,v,oldlabel))
+        self.edges_.discard((u,v,oldlabel))
+        self.edges_.add((u,v,label))
+        if self.edge_index_: self.edge_index_.edge_changed(u,v,oldlabel,label)
+
+    def network_labels(self):
+        """ Return the list of vertex labels in vertex order """
+        return self.labels_
+
+    def labeled_edges(self):
+        """ Return the set of (u,v,label) edges """
+        return self.edges_
+
+    def candidate_edges(self, edgelist, swap_edge_reg):
+        """ Return the edges from edgelist (or allowed by the constraints, without an edgelist) that can be added,
+            or None if they are not indexed """
+        if self.edge_index_ and self.edge_index_.indexes(edgelist,swap_edge_reg):
+            return self.edge_index_.candidates_
+        return None
+
+    def candidate_nodes(self, nodelist, edgelist):
+        """ Return the CandidateNodes index for nodelist and edgelist, or None if they are not indexed """
+        if self.node_index_ and self.node_index_.indexes(nodelist,edgelist):
+            return self.node_index_
+        return None
+
+    def counts_parameters(self):
+        return isinstance(self.graph_,parametercount.ParameterCountGraph)
+
+    def rollback(self):
+        """ Undo every change since the graph was wrapped """
+        while self.log_:
+            change = self.log_.pop()
+            if len(change) == 2:
+                (v,label) = change
+                if self.edge_index_: self.edge_index_.vertex_removed(v,label)
+                if self.node_index_: self.node_index_.vertex_removed(v,label)
+                self.graph_.remove_vertex(v)
+                self.labels_.pop()
+            else:
+                (u,v,oldlabel) = change
+                label = self.graph_.edge_label(u,v)
+                self.edges_.discard((u,v,label))
+                if self.edge_index_: self.edge_index_.edge_changed(u,v,label,oldlabel)
+                if oldlabel is None:
+                    self.graph_.remove_edge(u,v)
+                else:
+                    self.graph_.add_edge(u,v,oldlabel)
+                    self.edges_.add((u,v,oldlabel))
+
+
+class CandidateEdges(object):
+    """ Index of the edges in edgelist that can be added to a WorkingGraph, as (source vertex, target vertex, regulation).
+        An edge is a candidate when both of its nodes are in the graph and the graph does not already have it, or,
+        when not swap_edge_reg, does not have any edge between the same nodes. The WorkingGraph reports its changes
+        so that only the edges touching a changed node or node pair are looked at.
+        With weights (a dictionary keyed by edgelist edges), candidates are drawn in proportion to their weights.
+    """
+
+    def __init__(self, graph, edgelist, swap_edge_reg, weights=None):
+        self.graph_ = graph
+        self.edgelist_ = edgelist
+        self.swap_edge_reg_ = swap_edge_reg
+        # edgelist entries by node label, and regulations in edgelist by vertex pair for nodes in the graph
+        self.label_edges_ = defaultdict(list)
+        for e in set(edgelist):
+            self.label_edges_[e[0]].append(e)
+            if e[1] != e[0]: self.label_edges_[e[1]].append(e)
+        self.pair_regs_ = defaultdict(list)
+        if weights:
+            labels = graph.network_labels()
+            self.candidates_ = WeightedRandomSet(lambda edge : weights.get((labels[edge[0]],labels[edge[1]],edge[2]),1.0))
+        else:
+            self.candidates_ = RandomSet()
+        for e in set(edgelist):
+            self._register(e,1)
+
+    def indexes(self, edgelist, swap_edge_reg):
+        return edgelist is self.edgelist_ and swap_edge_reg == self.swap_edge_reg_
+
+    def vertex_added(self, v, label):
+        for e in self.label_edges_[label]: self._register(e,1)
+
+    def vertex_removed(self, v, label):
+        for e in self.label_edges_[label]: self._register(e,-1)
+
+    def edge_changed(self, u, v, oldlabel, newlabel):
+        # oldlabel or newlabel is None when there is no edge u -> v
+        for reg in self.pair_regs_[(u,v)]:
+            self._update((u,v,reg),newlabel)
+
+    def _register(self, e, change):
+        u,v = self.graph_.get_vertex_from_label(e[0]), self.graph_.get_vertex_from_label(e[1])
+        if u is None or v is None: return
+        edge = (u,v,e[2])
+        if change > 0:
+            self.pair_regs_[(u,v)].append(e[2])
+            self._update(edge,self.graph_.edge_label(u,v) if v in self.graph_.adjacencies(u) else None)
+        else:
+            self.pair_regs_[(u,v)].remove(e[2])
+            self.candidates_.discard(edge)
+
+    def _update(self, edge, label):
+        if (label is None) or (self.swap_edge_reg_ and label != edge[2]): self.candidates_.add(edge)
+        else: self.candidates_.discard(edge)
+
+
+class AllowedEdges(object):
+    """ Index of the edges between vertices of a WorkingGraph that constraints (a Constraints instance) allow and that
+        can be added to it, as (source vertex, target vertex, regulation), for perturbing without an edgelist.
+        Negative self-loops are left out. Edges are candidates as in CandidateEdges, and are updated in the same way
+        when the WorkingGraph reports its changes, so that adding a vertex only looks at the edges touching it.
+    """
+
+    def __init__(self, graph, constraints, swap_edge_reg):
+        self.graph_ = graph
+        self.constraints_ = constraints
+        self.swap_edge_reg_ = swap_edge_reg
+        self.candidates_ = RandomSet()
+        self.vertices_ = []
+        for v,label in enumerate(graph.network_labels()):
+            self.vertex_added(v,label)
+
+    def indexes(self, edgelist, swap_edge_reg):
+        return not edgelist and swap_edge_reg == self.swap_edge_reg_
+
+    def vertex_added(self, v, label):
+        self.vertices_.append(v)
+        for w in self.vertices_:
+            for (s,t) in set([(v,w),(w,v)]):
+                self.edge_changed(s,t,None,self.graph_.edge_label(s,t) if t in self.graph_.adjacencies(s) else None)
+
+    def vertex_removed(self, v, label):
+        self.vertices_.remove(v)
+        for w in self.vertices_ + [v]:
+            for r in 'ar':
+                self.candidates_.discard((v,w,r))
+                self.candidates_.discard((w,v,r))
+
+    def edge_changed(self, u, v, oldlabel, newlabel):
+        labels = self.graph_.network_labels()
+        for r in 'ar':
+            if (u != v or r == 'a') and self.constraints_.allows(labels[u],labels[v],r):
+                if (newlabel is None) or (self.swap_edge_reg_ and newlabel != r): self.candidates_.add((u,v,r))
+                else: self.candidates_.discard((u,v,r))
+
+
+class CandidateNodes(object):
+    """ Index of the nodes in nodelist that addNodeAndConnectingEdges can add to a WorkingGraph. Without an edgelist, these
+        are the nodes not in the graph. With an edgelist, they also need an in-edge from and an out-edge to the graph in
+        the edgelist, and those edges are indexed by node, so that a node and its edges are drawn in constant time.
+        Adding a node to the graph only looks at the edgelist entries of that node. Changes must be undone in reverse
+        order, as WorkingGraph.rollback does. Nodes and edges are drawn in proportion to nodeweights and edgeweights
+        (dictionaries keyed by nodelist nodes and edgelist edges), when given.
+    """
+
+    def __init__(self, graph, nodelist, edgelist, edgeweights=None, nodeweights=None):
+        self.graph_ = graph
+        self.nodelist_ = nodelist
+        self.edgelist_ = edgelist
+        self.nodes_ = set(nodelist)
+        nodeset = (lambda : WeightedRandomSet(lambda n : nodeweights.get(n,1.0))) if nodeweights else RandomSet
+        edgeset = (lambda : WeightedRandomSet(lambda e : edgeweights.get(e,1.0))) if edgeweights else RandomSet
+        # nodelist nodes not in the graph
+        self.new_ = nodeset()
+        for n in nodelist:
+            if graph.get_vertex_from_label(n) is None: self.new_.add(n)
+        if edgelist:
+            # edgelist entries by source and by target label (self-edges never connect a new node to the graph)
+            self.from_ = defaultdict(list)
+            self.to_ = defaultdict(list)
+            for e in set(edgelist):
+                if e[0] != e[1]:
+                    self.from_[e[0]].append(e)
+                    self.to_[e[1]].append(e)
+            # edges between each new node and the graph, and the new nodes that have both
+            self.inedges_ = defaultdict(edgeset)
+            self.outedges_ = defaultdict(edgeset)
+            self.candidates_ = nodeset()
+            for label in graph.network_labels():
+                self._connect(label,True)
+
+    def indexes(self, nodelist, edgelist):
+        return nodelist is self.nodelist_ and edgelist is self.edgelist_
+
+    def draw(self):
+        """ Return a random node that can be added with a random in-edge and out-edge (None for both without an
+            edgelist), or (None,None,None) if there is none """
+        if not self.edgelist_:
+            return getRandomListElement(self.new_), None, None
+        node = getRandomListElement(self.candidates_)
+        if node is None: return None, None, None
+        return node, getRandomListElement(self.inedges_[node]), getRandomListElement(self.outedges_[node])
+
+    def vertex_added(self, v, label):
+        if label in self.nodes_:
+            self.new_.discard(label)
+            if self.edgelist_: self.candidates_.discard(label)
+        if self.edgelist_: self._connect(label,True)
+
+    def vertex_removed(self, v, label):
+        if self.edgelist_: self._connect(label,False)
+        if label in self.nodes_:
+            self.new_.add(label)
+            if self.edgelist_: self._update(label)
+
+    def _connect(self, label, added):
+        # label joins or leaves the graph, so its edges to and from new nodes do too
+        # an edge from label is an in-edge of its target, and an edge to label is an out-edge of its source
+        for edges,ends,k in [(self.from_[label],self.inedges_,1),(self.to_[label],self.outedges_,0)]:
+            for e in edges:
+                node = e[k]
+                if node not in self.new_: continue
+                if added: ends[node].add(e)
+                else: ends[node].discard(e)
+                self._update(node)
+
+    def _update(self, node):
+        if self.inedges_[node] and self.outedges_[node]: self.candidates_.add(node)
+        else: self.candidates_.discard(node)
+
+
+class RandomSet(object):
+    """ A set with constant time insertion, removal and random choice (it can be passed to getRandomListElement) """
+
+    def __init__(self, items=()):
+        self.items_ = []
+        self.positions_ = {}
+        for x in items: self.add(x)
+
+    def add(self, x):
+        if x not in self.positions_:
+            self.positions_[x] = len(self.items_)
+            self.items_.append(x)
+
+    def discard(self, x):
+        k = self.positions_.pop(x,None)
+        if k is None: return
+        last = self.items_.pop()
+        if k < len(self.items_):
+            self.items_[k] = last
+            self.positions_[last] = k
+
+    def __contains__(self, x):
+        return x in self.positions_
+
+    def __len__(self):
+        return len(self.items_)
+
+    def __getitem__(self, k):
+        return self.items_[k]
+
+    def __iter__(self):
+        return iter(self.items_)
+
+
+class WeightedRandomSet(object):
+    """ A set with constant time insertion and removal, and random choice in proportion to weight(item) (nonnegative).
+        Choices are drawn in constant time from an alias table of the items at the last rebuild, skipping the items
+        removed since then, or from a short list of the items added since then. The table is rebuilt when the removed
+        items make up most of its weight or too many items have been added, so a set that keeps returning to the same
+        items, like the candidates of a WorkingGraph that is rolled back, is rarely rebuilt.
+    """
+
+    def __init__(self, weight, items=()):
+        self.weight_ = weight
+        self.weights_ = {}
+        self._rebuild()
+        for x in items: self.add(x)
+
+    def add(self, x):
+        if x in self.weights_: return
+        w = self.weights_[x] = self.weight_(x)
+        if x in self.removed_:
+            self.removed_.remove(x)
+            self.removedweight_ -= w
+        else:
+            self.added_.append(x)
+            self.addedweight_ += w
+
+    def discard(self, x):
+        w = self.weights_.pop(x,None)
+        if w is None: return
+        if x in self.table_items_:
+            self.removed_.add(x)
+            self.removedweight_ += w
+        else:
+            self.added_.remove(x)
+            self.addedweight_ -= w
+
+    def choice(self):
+        """ Return a random item, or None if the set is empty or all weights are zero """
+        if self.removedweight_ > 0.5*self.tableweight_ or len(self.added_) > max(16,len(self.table_)**0.5):
+            self._rebuild()
+        total = self.tableweight_-self.removedweight_+self.addedweight_
+        if not self.weights_ or total <= 0: return None
+        while True:
+            x = random.random()*(self.tableweight_+self.addedweight_)
+            if x < self.tableweight_:
+                k = random.randrange(len(self.table_))
+                item = self.table_[k] if random.random() < self.probabilities_[k] else self.table_[self.aliases_[k]]
+                if item not in self.removed_: return item
+            else:
+                x -= self.tableweight_
+                for item in self.added_:
+                    x -= self.weights_[item]
+                    if x < 0: return item
+                if self.added_: return self.added_[-1]
+
+    def _rebuild(self):
+        # Vose's alias method: every slot k holds the item table_[k] with probability probabilities_[k], otherwise table_[aliases_[k]]
+        self.table_ = [ x for x in self.weights_ if self.weights_[x] > 0 ]
+        self.table_items_ = set(self.weights_)
+        self.tableweight_ = float(sum(self.weights_[x] for x in self.table_))
+        self.removed_ = set()
+        self.removedweight_ = 0.0
+        self.added_ = []
+        self.addedweight_ = 0.0
+        n = len(self.table_)
+        self.probabilities_ = [ self.weights_[x]*n/self.tableweight_ for x in self.table_ ]
+        self.aliases_ = range(n)
+        small = [ k for k in range(n) if self.probabilities_[k] < 1.0 ]
+        large = [ k for k in range(n) if self.probabilities_[k] >= 1.0 ]
+        while small and large:
+            k, j = small.pop(), large.pop()
+            self.aliases_[k] = j
+            self.probabilities_[j] += self.probabilities_[k]-1.0
+            if self.probabilities_[j] < 1.0: small.append(j)
+            else: large.append(j)
+        for k in small+large:
+            self.probabilities_[k] = 1.0
+
+    def __contains__(self, x):
+        return x in self.weights_
+
+    def __len__(self):
+        return len(self.weights_)
+
+    def __iter__(self):
+        return iter(self.weights_)
+
+
+#####################################################################################################################
+# Parallel perturbation. Worker processes generate and check candidates; the calling process dedupes and collects.
+#####################################################################################################################
+
+def samplePerturbationsInParallel(starting_graph,seen,params,stopwatch,stats,batch_time=1.0):
+    # yield random perturbations and their parameter counts until time runs out; seen is the set of network specs already accepted
+    # each round, every worker searches for batch_time seconds or until it alone has found all of the missing networks,
+    # skipping the specs known at the start of the round
+    # workers report the outcomes of their attempts, which are added to stats, and adaptive choices are shared between rounds
+    # the missing networks are counted from stats, where the caller takes back the networks that don't fit a parameter budget
+    # the workers keep the accepted specs between rounds: they get seen once, when they start, and each round only the
+    # networks accepted since the worker furthest behind last heard, as their encodings (see networkencoding)
+    pool = multiprocessing.Pool(params['numprocesses'],_initPerturbationWorker,([ networkencoding.encodeNetworkSpec(spec) for spec in seen ],))
+    chooser = getAdaptiveChoices(params)
+    # encodings of the networks accepted in this run, in order, and how many of them each worker (by pid) has
+    accepted = []
+    synced = {}
+    try:
+        rounds = 0
+        while stopwatch.elapsed() < params['time_to_wait']:
+            batch = min(batch_time,params['time_to_wait']-stopwatch.elapsed())
+            needed = params['numperturbations']-stats.counts['accepted']
+            start = min(synced.values()) if len(synced) == params['numprocesses'] else 0
+            jobs = [ (starting_graph,params,start,accepted[start:],needed,batch,getRandomSeed(params,rounds,k),chooser) for k in range(params['numprocesses']) ]
+            rounds += 1
+            for networks,workerstats,workerchooser,pid,count in pool.imap_unordered(_perturbationWorker,jobs):
+                synced[pid] = count
+                stats.update(workerstats)
+                if chooser: chooser.update(workerchooser)
+                for network_spec,paramcount in networks:
+                    # workers don't see each other's results within a round, so dedupe again here
+                    if network_spec not in seen:
+                        seen.add(network_spec)
+                        accepted.append(networkencoding.encodeNetworkSpec(network_spec))
+                        stats.record('accepted')
+                        yield network_spec, paramcount
+                    else:
+                        stats.record('duplicate')
+    finally:
+        pool.terminate()
+        pool.join()
+
+# in a worker process, the network specs known to be accepted, and how many of the run's accepted networks are among them
+_worker_known = None
+_worker_synced = 0
+
+def _initPerturbationWorker(codes):
+    # runs once in each worker process; codes are the encodings of the network specs accepted before the workers started
+    global _worker_known, _worker_synced
+    _worker_known = set( networkencoding.decodeNetworkSpec(code) for code in codes )
+    _worker_synced = 0
+
+def _perturbationWorker(args):
+    # runs in a worker process; must be a module level function so that it can be pickled
+    # codes are the encodings of the accepted networks from number start on, of which the worker only decodes the ones it
+    # doesn't have yet; candidates are then checked against the decoded specs, without encoding them
+    # returns the network specs found with their parameter counts, the outcomes of the rejected attempts, the adaptive
+    # choices made (or None), the worker's pid, and how many accepted networks it has
+    global _worker_synced
+    starting_graph,params,start,codes,needed,batch_time,seed,chooser = args
+    for code in codes[max(_worker_synced-start,0):]:
+        _worker_known.add(networkencoding.decodeNetworkSpec(code))
+    _worker_synced = start+len(codes)
+    known = _worker_known
+    # forked workers inherit the parent's random state, so reseed each one
+    random.seed(seed)
+    constraints = getConstraints(params)
+    working_graph = WorkingGraph(starting_graph,params['edgelist'],params['swap_edge_reg'],params['nodelist'],params.get('edgeweights'),params.get('nodeweights'),constraints)
+    if chooser: chooser = chooser.fresh()
+    stats = PerturbationStats()
+    found = []
+    start_time = time.time()
+    while (len(found) < needed) and (time.time()-start_time < batch_time):
+        network_spec = makePerturbation(working_graph,params,stats,chooser,constraints)
+        paramcount = checkPerturbation(network_spec,known,params,stats)
+        if chooser: chooser.record(bool(paramcount))
+        if paramcount:
+            known.add(network_spec)
+            found.append((network_spec,paramcount))
+    return found, stats, chooser, os.getpid(), _worker_synced
+
+
+#####################################################################################################################
+# Exhaustive perturbation. Breadth-first walk over every network reachable within maxadditionspergraph additions.
+#####################################################################################################################
+
+def enumeratePerturbations(starting_graph,seen,params,stopwatch,stats,reused=()):
+    # yield every network within maxadditionspergraph additions of starting_graph with its parameter count; seen is the set of network specs already accepted
+    # reused is the set of specs in seen that were taken from a catalog; they are not yielded again, but are still expanded
+    # adding edges and nodes never lowers the parameter count, so a network with too many parameters is not expanded
+    # regulation swaps can lower it, so they are only made before any addition, and those networks are always expanded
+    # networks missing a required edge are expanded but not yielded
+    constraints = getConstraints(params)
+    numfixed = len(starting_graph.vertices())
+    numseededges = len(starting_graph.edges())
+    anonymous = not params['nodelist']
+    addnodes = bool(params['nodelist'] or (not params['edgelist'] and params['add_madeup_nodes'] == 'y'))
+
+    def onlyswapped(graph):
+        return len(graph.vertices()) == numfixed and len(graph.edges()) == numseededges
+
+    found = 0
+    foundreused = 0
+    frontier = [starting_graph]
+    for depth in range(params['maxadditionspergraph']):
+        nextfrontier = []
+        for graph in frontier:
+            swapping = params['swap_edge_reg'] and onlyswapped(graph)
+            for child in enumerateAdditions(graph,params['edgelist'],params['nodelist'] if addnodes else [],swapping,constraints):
+                if stopwatch.elapsed() > params['time_to_wait']:
+                    return
+                network_spec = intervalgraph.createCanonicalNetworkSpecFromGraph(child,numfixed,anonymous)
+                if network_spec in seen:
+                    stats.record('duplicate')
+                    if network_spec in reused:
+                        reused.discard(network_spec)
+                        foundreused += 1
+                        nextfrontier.append(child)
+                    continue
+                seen.add(network_spec)
+                if constraints and not constraints.satisfied(child):
+                    stats.record('constraint')
+                    nextfrontier.append(child)
+                    continue
+                if isinstance(child,parametercount.ParameterCountGraph):
+                    paramcount = child.parameter_count()
+                    smallenough = paramcount is not None and paramcount <= int(params['maxparams'])
+                    if not smallenough: stats.record('noncomputable' if paramcount is None else 'maxparams')
+                    accept = smallenough and checkComputability(network_spec,params['maxparams'],stats)
+                else:
+                    accept = smallenough = checkComputability(network_spec,params['maxparams'],stats)
+                if accept:
+                    stats.record('accepted')
+                    found += 1
+                    yield network_spec, accept
+                if smallenough or onlyswapped(child):
+                    nextfrontier.append(child)
+        frontier = nextfrontier
+    if foundreused:
+        print "Network enumeration complete. Found all {} perturbations, {} of them from the catalog.".format(found+foundreused+1,foundreused)
+    else:
+        print "Network enumeration complete. Found all {} perturbations.".format(found+1)
+
+def enumerateAdditions(graph,edgelist=None,nodelist=[],swap_edge_reg=True,constraints=None):
+    # yield a copy of graph for every single edge or node addition that the "add" functions below can make
+    # if swap_edge_reg, existing edges may have their regulation swapped
+    # nodelist=None means anonymous nodes are added, an empty list means no nodes are added
+    # constraints is an optional Constraints instance; edgelist is expected to be filtered by it already
+    networknodenames = getNetworkLabels(graph)
+    N = len(networknodenames)
+    graph_edges = [(v,a,graph.edge_label(v,a)) for v in graph.vertices() for a in graph.adjacencies(v)]
+
+    def withEdges(newlabel,edges):
+        newgraph = graph.clone()
+        if newlabel is not None: newgraph.add_vertex(N,label=newlabel)
+        for edge in edges: newgraph.add_edge(*edge)
+        if newlabel is not None and constraints: constraints.add_selfloop(newgraph,N)
+        return newgraph
+
+    def allowed(edge,newlabel=None):
+        if not constraints: return True
+        labels = [ newlabel if v == N else networknodenames[v] for v in edge[:2] ]
+        return constraints.allows(labels[0],labels[1],edge[2])
+
+    # edges (negative self-loops are only excluded when there is no edgelist, as in addEdge)
+    if edgelist:
+        newedges = set( tuple(getVertexFromLabel(graph,e[:2])+[e[2]]) for e in edgelist if set(e[:2]).issubset(networknodenames) )
+    else:
+        newedges = set( (u,v,r) for u in range(N) for v in range(N) for r in 'ar' if (u != v or r == 'a') and allowed((u,v,r)) )
+    if swap_edge_reg: newedges = newedges.difference(graph_edges)
+    else: newedges = [ e for e in newedges if e[1] not in graph.adjacencies(e[0]) ]
+    for edge in sorted(newedges):
+        yield withEdges(None,[edge])
+
+    # nodes with one in-edge and one out-edge, as in addNodeAndConnectingEdges
+    if nodelist is None or not edgelist:
+        if nodelist is None: newlabels = [ getMadeupNodeLabel(networknodenames) ]
+        else: newlabels = [ n for n in nodelist if n not in networknodenames ]
+        inedges = [ (N,N,'a') ] + [ (u,N,r) for u in range(N) for r in 'ar' ]
+        outedges = [ (N,v,r) for v in range(N) for r in 'ar' ]
+        for newlabel in newlabels:
+            for inedge,outedge in itertools.product(inedges,outedges):
+                if allowed(inedge,newlabel) and allowed(outedge,newlabel):
+                    yield withEdges(newlabel,[inedge,outedge])
+    else:
+        for newlabel in [ n for n in nodelist if n not in networknodenames ]:
+            inedges = [ (graph.get_vertex_from_label(e[0]),N,e[2]) for e in edgelist if e[1] == newlabel and e[0] in networknodenames ]
+            outedges = [ (N,graph.get_vertex_from_label(e[1]),e[2]) for e in edgelist if e[0] == newlabel and e[1] in networknodenames ]
+            for inedge,outedge in itertools.product(inedges,outedges):
+                yield withEdges(newlabel,[inedge,outedge])
 
 
 ##########################################################################################
 # Check that database is both computable (logic files present) and as small as requested
 ##########################################################################################
 
-def checkComputability(network_spec,maxparams):
+def checkComputability(network_spec,maxparams,stats=None):
+    # return the parameter count of network_spec if it is computable and has at most maxparams parameters, otherwise False
+    # stats is an optional PerturbationStats instance that records the reason for a rejection
+    paramcount = getParameterCount(network_spec)
+    if paramcount is None:
+        print "\nNetwork spec not computable: \n{}\n".format(network_spec)
+        if stats: stats.record('noncomputable')
+        return False
+    smallenough = paramcount <= int(maxparams)
+    if not smallenough:
+        print "\nToo many parameters. Not using network spec: \n {}\n".format(network_spec)    
+        if stats: stats.record('maxparams')
+        return False
+    return paramcount
+
+def getParameterCount(network_spec):
+    # return the size of the DSGRN parameter graph, or None if the network spec is not computable
     network=DSGRN.Network()
     try:
         network.assign(network_spec)
-        paramgraph=DSGRN.ParameterGraph(network) 
-        smallenough = paramgraph.size() <= int(maxparams)
-        if not smallenough:
-            print "\nToo many parameters. Not using network spec: \n {}\n".format(network_spec)    
-        return smallenough
+        return DSGRN.ParameterGraph(network).size()
     except (AttributeError, RuntimeError):
-        print "\nNetwork spec not computable: \n{}\n".format(network_spec)
-        return False
+        return None
 
 ##############################################################################
 # Stochastic numbers of additional edges and/or nodes to perturb the network.
 ##############################################################################
 
-def perturbNetworkWithNodesAndEdges(graph,edgelist=None,nodelist=None,maxadditions=10,swap_edge_reg=True):
-    keepgoing = random.randrange(1,maxadditions+1)
+def perturbNetworkWithNodesAndEdges(graph,edgelist=None,nodelist=None,maxadditions=10,swap_edge_reg=True,chooser=None,constraints=None):
+    # if chooser (an AdaptiveChoices instance) is given, it makes the random choices
+    # if constraints (a Constraints instance) is given, only allowed edges are added
+    keepgoing = chooser.numadditions() if chooser else random.randrange(1,maxadditions+1)
     while keepgoing > 0:
         keepgoing -= 1
-        if random.randrange(2):
-            graph = addEdge(graph,edgelist,swap_edge_reg)
+        if (chooser.addedge() if chooser else random.randrange(2)):
+            graph = addEdge(graph,edgelist,swap_edge_reg,constraints)
             if graph is None: break
         else:
-            graph = addNodeAndConnectingEdges(graph,edgelist,nodelist)
+            graph = addNodeAndConnectingEdges(graph,edgelist,nodelist,constraints=constraints)
             if graph is None: break
     return graph
 
-def perturbNetworkWithEdgesOnly(graph,edgelist=None,maxadditions=10,swap_edge_reg=True):
-    keepgoing = random.randrange(1,maxadditions+1)
+def perturbNetworkWithEdgesOnly(graph,edgelist=None,maxadditions=10,swap_edge_reg=True,chooser=None,constraints=None):
+    keepgoing = chooser.numadditions() if chooser else random.randrange(1,maxadditions+1)
     while keepgoing > 0:
         keepgoing -= 1
-        graph = addEdge(graph,edgelist,swap_edge_reg)
+        graph = addEdge(graph,edgelist,swap_edge_reg,constraints)
         if graph is None: break
     return graph
 
@@ -104,11 +1089,12 @@ def perturbNetworkWithEdgesOnly(graph,edgelist=None,maxadditions=10,swap_edge_re
 # Basic methods of the network perturbation.
 ################################################################################################
 
-def addEdge(graph,edgelist=None,swap_edge_reg=True):
+def addEdge(graph,edgelist=None,swap_edge_reg=True,constraints=None):
     # if no edgelist, then a random edge is added to the network
     # if edgelist is specified, a random choice is made from the filtered edgelist 
     # (existing edges and repressing self-loops removed)
     # if swap_edge_reg, then existing edges in the graph may have their regulation swapped, otherwise existing edges are preserved 
+    # if constraints (a Constraints instance) is given, the random edge is one it allows; an edgelist is expected to be filtered by it already
 
     def isNegSelfLoop(edge):
         if edge[0]==edge[1] and edge[2]=='r': return True
@@ -117,22 +1103,25 @@ def addEdge(graph,edgelist=None,swap_edge_reg=True):
     # get info from graph
     networknodenames = getNetworkLabels(graph)
     N = len(networknodenames)
-    graph_edges = [(v,a,graph.edge_label(v,a)) for v in graph.vertices() for a in graph.adjacencies(v)]    
+    graph_edges = getLabeledEdges(graph)
     
     # make a new edge and add it to the graph
     # exclude trivial graphs because no edges can be added or swapped
     if N < 2: newedge = None
     # exclude complete graphs if we can't swap edge regulation because no edges can be added
-    elif not swap_edge_reg and all( set(graph.adjacencies(v)) == set(graph.vertices()) for v in graph.vertices() ): newedge = None   
+    elif not swap_edge_reg and len(graph_edges) == N*N: newedge = None   
     # choose newedge from filtered edgelist (note that all edges could be filtered out, so that newedge=None is possible)
     # buyer beware -- negative self-loops not removed
     elif edgelist:
-        edgelist = [ tuple(getVertexFromLabel(graph,e[:2])+[e[2]]) for e in edgelist if set(e[:2]).issubset(networknodenames) ]
-        if swap_edge_reg: edgelist = list(set(edgelist).difference(graph_edges))
-        else: edgelist = [ e for e in edgelist if e[1] not in graph.adjacencies(e[0]) ]
+        edgelist = getCandidateEdges(graph,edgelist,swap_edge_reg)
         newedge = getRandomListElement(edgelist)
         if newedge is None: graph=None
         else: graph.add_edge(*newedge) 
+    # with constraints, choose from the allowed edges, since there may be none to find by trial and error
+    elif constraints:
+        newedge = getRandomListElement(getAllowedEdges(graph,constraints,swap_edge_reg))
+        if newedge is None: graph=None
+        else: graph.add_edge(*newedge)
     # otherwise produce random edge (removing trivial and complete graphs ensures this will succeed)
     # negative self-loops are not added
     else:
@@ -141,51 +1130,63 @@ def addEdge(graph,edgelist=None,swap_edge_reg=True):
             while newedge in graph_edges or isNegSelfLoop(newedge): newedge = getRandomEdge(N) 
             graph.add_edge(*newedge) 
         else: 
-            graph_edges = [ e[:2] for e in graph_edges ]
             nodes = (getRandomNode(N), getRandomNode(N))
-            while nodes in graph_edges: nodes = (getRandomNode(N), getRandomNode(N))
+            while nodes[1] in graph.adjacencies(nodes[0]): nodes = (getRandomNode(N), getRandomNode(N))
             graph.add_edge( nodes[0], nodes[1], getRandomReg() if nodes[0] != nodes[1] else 'a' ) 
     return graph 
 
-def addNodeAndConnectingEdges(graph,edgelist=None,nodelist=None,swap_edge_reg=True):
+def addNodeAndConnectingEdges(graph,edgelist=None,nodelist=None,swap_edge_reg=True,constraints=None):
     # choose new node and connecting edges
     # if nodelist, choose random node from a (filtered) list
     #   if edgelist, choose random in- and out-edges from a (filtered) list
     #   if no edgelist, choose in- and out-edges randomly without a list
     # if no nodelist, make up a name for a new node (and add random edges sans edgelist)
+    # if constraints (a Constraints instance) is given, random edges are ones it allows, and the new node may get a self-edge
 
     networknodenames = getNetworkLabels(graph)
     N = len(networknodenames)
 
-    def makeupNode():
-        # make unique node name
-        newnodelabel = 'x'+str(N)
-        c=1
-        while newnodelabel in networknodenames:
-            # must terminate because networknodenames is finite
-            newnodelabel = 'x'+str(N+c)
-            c+=1
-        return newnodelabel
-
-    def randomInAndOut():
+    def randomInAndOut(newnodelabel):
         # get random in and out edges
         # in-edge is allowed to be an activating self-edge -- imitates drivers in gene networks
+        if constraints:
+            inedges = [(N,'a')] + [ (u,r) for u in range(N) for r in 'ar' if constraints.allows(networknodenames[u],newnodelabel,r) ]
+            outedges = [ (v,r) for v in range(N) for r in 'ar' if constraints.allows(newnodelabel,networknodenames[v],r) ]
+            if not outedges: return None, None
+            return getRandomListElement(inedges), getRandomListElement(outedges)
         innode = getRandomNode(N+1)
         if innode == N: inreg = 'a'
         else: inreg = getRandomReg()
         return (innode,inreg), (getRandomNode(N),getRandomReg())
 
+    # a WorkingGraph may keep the candidate nodes indexed
+    index = graph.candidate_nodes(nodelist,edgelist) if isinstance(graph,WorkingGraph) and nodelist is not None else None
+
     # get the new node and connecting edges
     if nodelist is None:
-        newnodelabel = makeupNode()        
-        (innode,inreg),(outnode,outreg) = randomInAndOut()
+        newnodelabel = getMadeupNodeLabel(networknodenames)
+        inedge,outedge = randomInAndOut(newnodelabel)
+        if outedge is None: graph = None
+        else: (innode,inreg),(outnode,outreg) = inedge,outedge
+    elif index is not None:
+        newnodelabel,inedge,outedge = index.draw()
+        if newnodelabel is None:
+            graph = None
+        elif inedge is None:
+            inedge,outedge = randomInAndOut(newnodelabel)
+            if outedge is None: graph = None
+            else: (innode,inreg),(outnode,outreg) = inedge,outedge
+        else:
+            [innode, outnode] = getVertexFromLabel(graph,[inedge[0],outedge[1]])
+            inreg, outreg = inedge[2], outedge[2]
     else:
         # filter nodelist to get only new nodes
         nodelist = [ n for n in nodelist if n not in networknodenames ]
         if edgelist is None:
             newnodelabel = getRandomListElement(nodelist)
-            if newnodelabel is None: graph = None
-            else: (innode,inreg),(outnode,outreg) = randomInAndOut()
+            inedge,outedge = (None,None) if newnodelabel is None else randomInAndOut(newnodelabel)
+            if outedge is None: graph = None
+            else: (innode,inreg),(outnode,outreg) = inedge,outedge
         else:
             # filter edgelist to get edges to and from network (or self-edges)
             # buyer beware -- negative self-edges not removed
@@ -204,6 +1205,7 @@ def addNodeAndConnectingEdges(graph,edgelist=None,nodelist=None,swap_edge_reg=Tr
         graph.add_vertex(N,label=newnodelabel)
         graph.add_edge(innode,N,label=inreg)
         graph.add_edge(N,outnode,label=outreg)
+        if constraints: constraints.add_selfloop(graph,N)
     return graph
 
 ##################################################################################################
@@ -213,8 +1215,44 @@ def addNodeAndConnectingEdges(graph,edgelist=None,nodelist=None,swap_edge_reg=Tr
 
 def getNetworkLabels(graph):
     # need node names to choose new nodes/edges
+    if isinstance(graph,WorkingGraph): return graph.network_labels()
     return [ graph.vertex_label(v) for v in graph.vertices() ]
 
+def getLabeledEdges(graph):
+    # need existing edges to avoid adding them again
+    if isinstance(graph,WorkingGraph): return graph.labeled_edges()
+    return set( (v,a,graph.edge_label(v,a)) for v in graph.vertices() for a in graph.adjacencies(v) )
+
+def getMadeupNodeLabel(networknodenames):
+    # make unique node name
+    N = len(networknodenames)
+    newnodelabel = 'x'+str(N)
+    c=1
+    while newnodelabel in networknodenames:
+        # must terminate because networknodenames is finite
+        newnodelabel = 'x'+str(N+c)
+        c+=1
+    return newnodelabel
+
+def getCandidateEdges(graph,edgelist,swap_edge_reg=True):
+    # filter edgelist to the edges that can be added to graph, as (source vertex, target vertex, regulation)
+    # a WorkingGraph keeps these indexed, otherwise the whole edgelist is filtered
+    if isinstance(graph,WorkingGraph):
+        candidates = graph.candidate_edges(edgelist,swap_edge_reg)
+        if candidates is not None: return candidates
+    networknodenames = getNetworkLabels(graph)
+    edgelist = [ tuple(getVertexFromLabel(graph,e[:2])+[e[2]]) for e in edgelist if set(e[:2]).issubset(networknodenames) ]
+    if swap_edge_reg: return list(set(edgelist).difference(getLabeledEdges(graph)))
+    else: return [ e for e in edgelist if e[1] not in graph.adjacencies(e[0]) ]
+
+def getAllowedEdges(graph,constraints,swap_edge_reg=True):
+    # the edges that constraints (a Constraints instance) allow and that can be added to graph, without negative self-loops
+    # a WorkingGraph made with the constraints and no edgelist keeps these indexed, otherwise they are all looked at
+    if isinstance(graph,WorkingGraph):
+        candidates = graph.candidate_edges(None,swap_edge_reg)
+        if candidates is not None: return candidates
+    return constraints.allowed_edges(graph,swap_edge_reg)
+
 def getVertexFromLabel(graph,nodelabels):
     return [ graph.get_vertex_from_label(n) for n in nodelabels ]
 
@@ -232,8 +1270,9 @@ def getRandomEdge(n):
     return (getRandomNode(n),getRandomNode(n),getRandomReg())
 
 def getRandomListElement(masterlist):
-    # pick randomly from list
+    # pick randomly from list (or from a WeightedRandomSet, in proportion to weight)
     if not masterlist: return None
+    elif isinstance(masterlist,WeightedRandomSet): return masterlist.choice()
     else: return masterlist[random.randrange(len(masterlist))]
 
 def getNodeAndConnectingEdgesFromLists(nodelist,edgelist):
@@ -257,3 +1296,24 @@ def getNodeAndConnectingEdgesFromLists(nodelist,edgelist):
         nodelist.remove(nodelabel)
         nodelabel,inedge,outedge = generateCandidate()
     return nodelabel,inedge,outedge
+
+
+def test():
+    # with a parameter budget that most perturbations exceed, the parallel search finds as many networks as the serial one,
+    # well before time runs out
+    network_spec = "A : (A)(~B) : E\nB : (A) : E\nC : (B) : E"
+    seedcount = getParameterCount(network_spec)
+    params = dict(network_spec=network_spec,edgelist=None,nodelist=None,numperturbations=30,time_to_wait=10,add_madeup_nodes='y',
+                  maxparams=100*seedcount,maxadditionspergraph=4,swap_edge_reg=True,seed=1,
+                  parambudget=100*seedcount,sizedistribution=[(seedcount,0.5),(100*seedcount,0.5)])
+    counts = []
+    for numprocesses in [1,2]:
+        params['numprocesses'] = numprocesses
+        stats = PerturbationStats()
+        counts.append(len(perturbNetwork(params,stats)))
+        print stats.elapsed < params['time_to_wait']/2.0
+    print counts[0] == counts[1]
+
+
+if __name__ == "__main__":
+    test()
@@ -1,5 +1,6 @@
 from pythonmodules.makejobs import Job 
 import networkperturbations as perturb
+import intervalgraph
 import subprocess, os, DSGRN, sys, itertools, json
 
 def makeSelfEdgePerturbations():
@@ -7,14 +8,12 @@ def makeSelfEdgePerturbations():
     job._parsefilesforperturbation()
     networks = perturb.perturbNetwork(job.params)
     numvars = len(filter(bool,job.params['network_spec'].split('\n'))) # number of vars in original network
+    # keep the networks where an added node has a self-edge, activating or repressing
     selfedgenets = []
     for n in networks:
-        eqns = filter(bool,n.split('\n'))
-        for e in eqns[numvars:]:
-            var,expr = (l.replace(' ','') for l in e.split(':')[:2])
-            if var in expr: # FIX: assuming no var is a substring of another, should check
-                selfedgenets.append(n)
-                break
+        graph = intervalgraph.getGraphFromNetworkSpec(n)
+        if any( v in graph.adjacencies(v) for v in graph.vertices() if v >= numvars ):
+            selfedgenets.append(n)
     print len(selfedgenets)
     job.NETWORKDIR = './selfedgenetworks'
     subprocess.call('mkdir '+job.NETWORKDIR,shell=True)
@@ -35,6 +34,7 @@ def makeYaoGraphs():
     params['maxadditionspergraph'] = 6
     params['maxparams'] = 10000000000
     params['time_to_wait'] = 5
+    params['enumerate'] = 'y'
 
     job=Job(params=params)
     job._parsefilesforperturbation()
@@ -230,6 +230,8 @@ def makeE2FNetwork4WavepoolPerturbations(location='qsub',netfile='/Users/bcummin
     params['maxparams'] = 2100000
     params['time_to_wait'] = 120
     params['queryfile'] = './shellscripts/doubleFPqueryscript_E2F_withparamfiles.sh'
+    # S stays (S)
+    params['immutablenodes'] = ['S']
 
     job=Job(location,params)
 
@@ -241,16 +243,9 @@ def makeE2FNetwork4WavepoolPerturbations(location='qsub',netfile='/Users/bcummin
     job._parsefilesforperturbation()
     networks = perturb.perturbNetwork(job.params)
     print len(networks)
-    filterednetworks = []
-    for net in networks:
-        eqns = net.split('\n')
-        parts = eqns[0].replace(':',' ').split()
-        if parts[1] == '(S)':
-            filterednetworks.append(net)
-    print len(filterednetworks)
     job.NETWORKDIR = netdir
     subprocess.call('mkdir '+job.NETWORKDIR,shell=True)
-    job._savefiles(filterednetworks)
+    job._savefiles(networks)
 
 # def fullinducibility_E2Fnetwork4perturbations(path = '/Users/bcummins/ProjectSimulationResults/E2F_Rb_paper_data/6D_2016_08_26_cancerE2Fnetwork4perturbations',writeparams=False):
 #     def internal(networkspec,bistablefname,savefname):
@@ -0,0 +1,165 @@
+import numpy as np
+import intervalgraph
+import networkperturbations as perturb
+import sys
+
+#####################################################################################################################
+# Degree-preserving shuffles of a network, for null models.
+# A shuffle repeatedly swaps the targets of two edges, u -> v and w -> x becoming u -> x and w -> v, so that every node
+# keeps its in-degree and out-degree and every edge keeps its regulation (so the number of activating and repressing
+# edges, and each node's activating and repressing out-edges, stay the same). Swaps that would make an existing edge
+# or a repressing self-loop are skipped. A batch of shuffles is held as numpy arrays of edge targets and every swap
+# is drawn for the whole batch at once.
+# The external API is shuffleNetwork and iterShuffles; networks can also be shuffled from the command line with
+# shellscripts/networkshuffles.sh.
+#####################################################################################################################
+
+# attempted swaps per edge before a shuffle is taken as well mixed
+SWAPSPEREDGE = 10
+
+# number of shuffles made at a time when params has no batchsize
+BATCHSIZE = 256
+
+def shuffleNetwork(params,stats=None):
+    # params is a dictionary with the following keys:
+    # network_spec : DSGRN network specification string
+    # numshuffles : number of shuffles to return
+    # maxparams : maximum number of parameters allowed for a shuffled network
+    # time_to_wait : maximum number of seconds to spend making shuffles
+    # seed, shard : (optional) as in networkperturbations.perturbNetwork
+    # swapsperedge : (optional) attempted swaps per edge for each shuffle (default SWAPSPEREDGE)
+    # batchsize : (optional) number of shuffles made at a time (default BATCHSIZE)
+    # stats is an optional networkperturbations.PerturbationStats instance that counts the outcomes
+    #
+    # the output is a list of network specs; the first is the network itself and the rest are distinct shuffles
+    return list(iterShuffles(params,stats))
+
+def iterShuffles(params,stats=None):
+    # same as shuffleNetwork, but network specs are yielded one at a time as they are made
+    if stats is None: stats = perturb.PerturbationStats()
+    starting_graph = intervalgraph.getGraphFromNetworkSpec(params['network_spec'])
+    numnodes = len(starting_graph.vertices())
+    network_spec = intervalgraph.createCanonicalNetworkSpecFromGraph(starting_graph,numnodes)
+    shuffler = NetworkShuffler(starting_graph,params,perturb.getRandomSeed(params,'shuffle'))
+    seen = set([network_spec])
+    stopwatch = perturb.Stopwatch()
+    count = 1
+    yield network_spec
+    while count < params['numshuffles']+1 and stopwatch.elapsed() < params['time_to_wait']:
+        for network_spec in shuffler.sample(params.get('batchsize') or BATCHSIZE,stats):
+            if network_spec in seen:
+                stats.record('duplicate')
+                continue
+            seen.add(network_spec)
+            stats.record('accepted')
+            count += 1
+            stopwatch.pause()
+            yield network_spec
+            stopwatch.resume()
+            if count == params['numshuffles']+1: break
+    stats.elapsed = stopwatch.elapsed()
+    if count < params['numshuffles']+1:
+        print "Network shuffling timed out. Proceeding with {} networks.".format(count)
+        print stats.report()
+
+
+class NetworkShuffler(object):
+    """ Makes degree-preserving shuffles of graph (an intervalgraph.Graph), batchsize at a time.
+        params are the shuffleNetwork parameters. Shuffles with more than params['maxparams'] parameters, or that DSGRN
+        cannot compute, are dropped before their network specs are made.
+    """
+
+    def __init__(self, graph, params, seed=None):
+        self.random_ = np.random.RandomState(None if seed is None else seed % 2**32)
+        self.maxparams_ = int(params['maxparams'])
+        self.swapsperedge_ = params.get('swapsperedge') or SWAPSPEREDGE
+        self.labels_ = [ graph.vertex_label(v) for v in range(len(graph.vertices())) ]
+        edges = sorted( (u,v,1 if graph.edge_label(u,v) == 'a' else -1) for (u,v) in graph.edges() )
+        self.src_, self.tgt_, self.reg_ = [ np.array(x,dtype=int) for x in zip(*edges) ] if edges else [ np.zeros(0,dtype=int) ]*3
+        # parameter counts by the (activators, repressors, outputs) of every node, which is all they depend on
+        # (see parametercount); in- and out-degrees never change, so there are few of these
+        self.paramcounts_ = {}
+
+    def sample(self, batchsize, stats=None):
+        """ Return the network specs of the shuffles out of batchsize that are small enough and computable.
+            The outcomes of the others are recorded in stats (a networkperturbations.PerturbationStats), if given.
+        """
+        B, N, E = batchsize, len(self.labels_), len(self.reg_)
+        rows = np.arange(B)
+        tgt = np.repeat(self.tgt_[np.newaxis],B,axis=0)
+        adj = np.zeros((B,N,N),dtype=bool)
+        adj[:,self.src_,self.tgt_] = True
+        for step in range(self.swapsperedge_*E if E > 1 else 0):
+            i = self.random_.randint(E,size=B)
+            j = self.random_.randint(E,size=B)
+            si, sj, ti, tj = self.src_[i], self.src_[j], tgt[rows,i], tgt[rows,j]
+            ok = (si != sj) & (ti != tj) & ~adj[rows,si,tj] & ~adj[rows,sj,ti]
+            ok &= ~((si == tj) & (self.reg_[i] < 0)) & ~((sj == ti) & (self.reg_[j] < 0))
+            r = rows[ok]
+            adj[r,si[ok],ti[ok]] = False
+            adj[r,sj[ok],tj[ok]] = False
+            adj[r,si[ok],tj[ok]] = True
+            adj[r,sj[ok],ti[ok]] = True
+            tgt[r,i[ok]] = tj[ok]
+            tgt[r,j[ok]] = ti[ok]
+        signed = np.zeros((B,N,N),dtype=np.int8)
+        signed[rows[:,np.newaxis],self.src_[np.newaxis],tgt] = self.reg_[np.newaxis]
+        survivors = self._screen(signed,stats)
+        return self._networkSpecs(signed,survivors,stats)
+
+    def _screen(self, signed, stats):
+        # return the indices of the shuffles that are computable and have at most maxparams parameters
+        # the parameter count is found in DSGRN once for each kind of node degrees
+        N = len(self.labels_)
+        codes = ((signed == 1).sum(1)*(N+1)+(signed == -1).sum(1))*(N+1)+(signed != 0).sum(2)
+        keys = np.sort(codes,axis=1)
+        survivors = []
+        for b in range(len(signed)):
+            key = keys[b].tostring()
+            if key not in self.paramcounts_:
+                self.paramcounts_[key] = perturb.getParameterCount(self._networkSpec(signed[b]))
+            paramcount = self.paramcounts_[key]
+            if paramcount is None:
+                if stats: stats.record('noncomputable')
+            elif paramcount > self.maxparams_:
+                if stats: stats.record('maxparams')
+            else:
+                survivors.append(b)
+        return survivors
+
+    def _networkSpecs(self, signed, survivors, stats):
+        # network specs of the shuffles in survivors; shuffles with identical arrays are only made once
+        specs = []
+        made = set()
+        for b in survivors:
+            key = signed[b].tostring()
+            if key in made:
+                if stats: stats.record('duplicate')
+                continue
+            made.add(key)
+            specs.append(self._networkSpec(signed[b]))
+        return specs
+
+    def _networkSpec(self, signed):
+        graph = intervalgraph.Graph()
+        for v,label in enumerate(self.labels_):
+            graph.add_vertex(v,label=label)
+        for u,v in zip(*np.nonzero(signed)):
+            graph.add_edge(int(u),int(v),label='a' if signed[u,v] > 0 else 'r')
+        return intervalgraph.createCanonicalNetworkSpecFromGraph(graph,len(self.labels_))
+
+
+if __name__ == '__main__':
+    # python networkshuffles.py networkfile numshuffles maxparams time_to_wait outputfolder [seed]
+    # writes the network and its shuffles to outputfolder/network<uid>.txt, as makejobs.Job does for perturbations
+    import os
+    params = {}
+    params['network_spec'] = open(sys.argv[1],'r').read()
+    params['numshuffles'] = int(sys.argv[2])
+    params['maxparams'] = int(sys.argv[3])
+    params['time_to_wait'] = float(sys.argv[4])
+    if len(sys.argv) > 6: params['seed'] = int(sys.argv[6])
+    networks = shuffleNetwork(params)
+    N = len(str(len(networks)))
+    for k,network_spec in enumerate(networks):
+        open(os.path.join(sys.argv[5],"network"+str(k).zfill(N)+".txt"),'w').write(network_spec)
@@ -0,0 +1,122 @@
+import os, math
+import intervalgraph
+
+#####################################################################################################################
+# Estimate the size of a DSGRN parameter graph without building it.
+# The parameter count is a product with one factor per node. The factor is the number of logic parameters for the
+# node's in-edge grouping and out-degree (the number of lines in the matching DSGRN logic file) times the number of
+# orderings of the node's out-edge thresholds. A missing logic file means that DSGRN cannot compute the network.
+#####################################################################################################################
+
+# cache of logic parameter counts keyed by logic file path; None means the file does not exist
+_logiccounts = {}
+
+def getLogicPath(dsgrn):
+    # location of the logic files in a DSGRN folder
+    return os.path.join(os.path.expanduser(dsgrn),'share','DSGRN','logic')
+
+def logicFileName(numinputs,numoutputs,factors,essential=True):
+    # DSGRN logic resources are named inputs_outputs_factorsizes[_E].dat, e.g. 3_2_2_1_E.dat
+    name = "_".join([str(numinputs),str(numoutputs)]+[str(f) for f in factors])
+    if essential: name += "_E"
+    return name + ".dat"
+
+def countLogicParameters(logicpath,numinputs,numoutputs,factors,essential=True):
+    # return the number of logic parameters for one node, or None if DSGRN has no logic file for it
+    fname = os.path.join(logicpath,logicFileName(numinputs,numoutputs,factors,essential))
+    if fname not in _logiccounts:
+        if os.path.isfile(fname):
+            with open(fname,'r') as f:
+                _logiccounts[fname] = sum(1 for line in f if line.strip())
+        else:
+            _logiccounts[fname] = None
+    return _logiccounts[fname]
+
+def countNodeParameters(logicpath,numactivators,numrepressors,numoutputs):
+    # return the parameter factor of one node, or None if DSGRN has no logic file for it
+    # activating in-edges are summed into one logic factor and each repressing in-edge is its own factor
+    factors = ([numactivators] if numactivators else []) + [1]*numrepressors
+    logic = countLogicParameters(logicpath,numactivators+numrepressors,numoutputs,factors)
+    return None if logic is None else logic*math.factorial(numoutputs)
+
+def estimateParameterCount(network_spec,logicpath):
+    # return the number of parameters of network_spec, or None if it is not computable
+    return getParameterCountGraph(network_spec,logicpath).parameter_count()
+
+def getParameterCountGraph(network_spec,logicpath):
+    # same as intervalgraph.getGraphFromNetworkSpec, but the graph tracks its parameter count
+    graph = intervalgraph.getGraphFromNetworkSpec(network_spec)
+    counted = ParameterCountGraph(logicpath)
+    for v in sorted(graph.vertices()):
+        counted.add_vertex(v,label=graph.vertex_label(v))
+    for (u,v) in graph.edges():
+        counted.add_edge(u,v,label=graph.edge_label(u,v))
+    return counted
+
+
+class ParameterCountGraph(intervalgraph.Graph):
+    """ An intervalgraph.Graph describing an essential network that keeps a table of per-node parameter factors.
+        Adding or removing the edge u -> v only updates the factors of u (out-degree) and v (in-edge grouping).
+        Activating in-edges ('a') are summed into one logic factor and each repressing in-edge ('r') is its own factor,
+        as in the network specs written by intervalgraph.createEssentialNetworkSpecFromGraph.
+    """
+
+    def __init__(self,logicpath):
+        intervalgraph.Graph.__init__(self)
+        self.logicpath_ = logicpath
+        self.activators_ = {}
+        self.repressors_ = {}
+        self.factors_ = {}
+
+    def add_vertex(self, v, label = ''):
+        if v in self.vertices(): return
+        intervalgraph.Graph.add_vertex(self,v,label)
+        self.activators_[v] = 0
+        self.repressors_[v] = 0
+        self._update_factor(v)
+
+    def add_edge(self, u, v, label = ''):
+        self.add_vertex(u)
+        self.add_vertex(v)
+        if v in self.adjacencies(u):
+            self._count_inedge(v,self.edge_label(u,v),-1)
+        intervalgraph.Graph.add_edge(self,u,v,label)
+        self._count_inedge(v,label,1)
+        self._update_factor(u)
+        self._update_factor(v)
+
+    def remove_edge(self, u, v):
+        if v in self.adjacencies(u):
+            self._count_inedge(v,self.edge_label(u,v),-1)
+            intervalgraph.Graph.remove_edge(self,u,v)
+            self._update_factor(u)
+            self._update_factor(v)
+
+    def remove_vertex(self, v):
+        intervalgraph.Graph.remove_vertex(self,v)
+        del self.activators_[v]
+        del self.repressors_[v]
+        del self.factors_[v]
+
+    def clone(self):
+        counted = intervalgraph.Graph.clone(self)
+        counted.logicpath_ = self.logicpath_
+        counted.activators_ = dict(self.activators_)
+        counted.repressors_ = dict(self.repressors_)
+        counted.factors_ = dict(self.factors_)
+        return counted
+
+    def parameter_count(self):
+        """ Return the number of DSGRN parameters, or None if some node has no logic file """
+        count = 1
+        for factor in self.factors_.values():
+            if factor is None: return None
+            count *= factor
+        return count
+
+    def _count_inedge(self, v, label, change):
+        if label == 'r': self.repressors_[v] += change
+        else: self.activators_[v] += change
+
+    def _update_factor(self, v):
+        self.factors_[v] = countNodeParameters(self.logicpath_,self.activators_[v],self.repressors_[v],len(self.adjacencies(v)))
@@ -0,0 +1,117 @@
+import sqlite3, hashlib, json, time
+
+#####################################################################################################################
+# A persistent catalog of network perturbations, so that reruns with the same seed network and settings reuse the
+# networks that were already made and checked in DSGRN instead of making them again.
+# Networks are keyed by a hash of their canonical network spec and stored with their parameter count. Each time a
+# network is accepted for a seed network, the seed network and the generation settings are recorded with it.
+#####################################################################################################################
+
+# perturbNetwork parameters that decide which networks can be made from a seed network
+# maxparams is left out because stored networks are filtered by their parameter counts instead
+FAMILY_SETTINGS = ['edgelist','nodelist','add_madeup_nodes','maxadditionspergraph','swap_edge_reg',
+                   'requirededges','forbiddenedges','immutablenodes','selfloops']
+
+# other perturbNetwork parameters stored with each run for reference
+RUN_SETTINGS = ['maxparams','enumerate','adaptive','seed','shard']
+
+def networkHash(network_spec):
+    # hash of a (canonical) network spec
+    return hashlib.sha1(network_spec).hexdigest()
+
+def settingsKey(params):
+    # hash of the settings in params that decide which perturbations can be made
+    settings = [ params.get(s) for s in FAMILY_SETTINGS ]
+    return hashlib.sha1(json.dumps(settings,sort_keys=True)).hexdigest()
+
+
+class PerturbationCatalog(object):
+    """ A SQLite file of network specs and their parameter counts, recording which seed network and settings each was made from.
+        The settings (which hold the whole edge and node lists) are stored once under their key (see register), and
+        each network only records the key and the run that made it.
+        Additions are committed every commitevery networks and on commit() or close().
+    """
+
+    def __init__(self, path, commitevery=100):
+        self.connection_ = sqlite3.connect(path)
+        self.commitevery_ = commitevery
+        self.uncommitted_ = 0
+        self.run_ = None
+        self.connection_.executescript("""
+            CREATE TABLE IF NOT EXISTS networks (
+                hash TEXT PRIMARY KEY,
+                network_spec TEXT NOT NULL,
+                paramcount INTEGER );
+            CREATE TABLE IF NOT EXISTS settings (
+                settings_key TEXT PRIMARY KEY,
+                settings TEXT NOT NULL );
+            CREATE TABLE IF NOT EXISTS runs (
+                run INTEGER PRIMARY KEY,
+                settings_key TEXT NOT NULL REFERENCES settings(settings_key),
+                settings TEXT NOT NULL,
+                created REAL NOT NULL );
+            CREATE TABLE IF NOT EXISTS generated (
+                hash TEXT NOT NULL REFERENCES networks(hash),
+                seed_hash TEXT NOT NULL REFERENCES networks(hash),
+                settings_key TEXT NOT NULL REFERENCES settings(settings_key),
+                run INTEGER REFERENCES runs(run),
+                created REAL NOT NULL,
+                PRIMARY KEY (hash, seed_hash, settings_key) );
+            CREATE INDEX IF NOT EXISTS generated_family ON generated (seed_hash, settings_key);
+        """)
+
+    def register(self, params):
+        """ Record the settings in params for this run and return their key, which add and networks take.
+            The settings are hashed and stored once here rather than for every network. """
+        key = settingsKey(params)
+        settings = json.dumps(dict( (s,params.get(s)) for s in FAMILY_SETTINGS ),sort_keys=True)
+        cursor = self.connection_.cursor()
+        cursor.execute("INSERT OR IGNORE INTO settings (settings_key, settings) VALUES (?,?)",(key,settings))
+        cursor.execute("INSERT INTO runs (settings_key, settings, created) VALUES (?,?,?)",
+                       (key,json.dumps(dict( (s,params.get(s)) for s in RUN_SETTINGS ),sort_keys=True),time.time()))
+        self.run_ = cursor.lastrowid
+        self.commit()
+        return key
+
+    def add(self, network_spec, paramcount, seed_spec, settings_key):
+        """ Record that network_spec (with paramcount parameters) was accepted as a perturbation of seed_spec with the
+            settings under settings_key (see register) """
+        cursor = self.connection_.cursor()
+        for spec,count in [(seed_spec,None),(network_spec,paramcount)]:
+            cursor.execute("INSERT OR IGNORE INTO networks (hash, network_spec, paramcount) VALUES (?,?,?)",(networkHash(spec),spec,count))
+        if paramcount is not None:
+            cursor.execute("UPDATE networks SET paramcount = ? WHERE hash = ? AND paramcount IS NULL",(paramcount,networkHash(network_spec)))
+        cursor.execute("INSERT OR IGNORE INTO generated (hash, seed_hash, settings_key, run, created) VALUES (?,?,?,?,?)",
+                       (networkHash(network_spec),networkHash(seed_spec),settings_key,self.run_,time.time()))
+        self.uncommitted_ += 1
+        if self.uncommitted_ >= self.commitevery_: self.commit()
+
+    def networks(self, seed_spec, settings_key, maxparams, limit=None):
+        """ Return the network specs made from seed_spec with the settings under settings_key and at most maxparams
+            parameters with their parameter counts, oldest first, not including seed_spec itself """
+        query = """SELECT n.network_spec, n.paramcount FROM generated g JOIN networks n ON g.hash = n.hash
+                   WHERE g.seed_hash = ? AND g.settings_key = ? AND g.hash != g.seed_hash AND n.paramcount <= ?
+                   GROUP BY g.hash ORDER BY MIN(g.created)"""
+        args = [networkHash(seed_spec),settings_key,int(maxparams)]
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        return [ (str(spec),paramcount) for spec,paramcount in self.connection_.execute(query,args) ]
+
+    def settings(self, settings_key):
+        """ Return the settings stored under settings_key as a dictionary, or None if there are none """
+        row = self.connection_.execute("SELECT settings FROM settings WHERE settings_key = ?",(settings_key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def paramcount(self, network_spec):
+        """ Return the stored parameter count of network_spec, or None if it is not known """
+        row = self.connection_.execute("SELECT paramcount FROM networks WHERE hash = ?",(networkHash(network_spec),)).fetchone()
+        return None if row is None else row[0]
+
+    def commit(self):
+        self.connection_.commit()
+        self.uncommitted_ = 0
+
+    def close(self):
+        self.commit()
+        self.connection_.close()
@@ -0,0 +1,142 @@
+import json
+import intervalgraph
+
+#####################################################################################################################
+# Compact storage of a family of network perturbations. The seed network spec is stored once, and each perturbation
+# is stored as its delta from the seed: the added nodes, the added edges, and the seed edges whose regulation was
+# swapped (and the seed edges that were removed, which only shuffles do). Nodes are matched by label.
+# A family file has one JSON line per entry: first {"seed" : seed network spec}, then one delta per network with its uid.
+# Graphs and network specs are only rebuilt from the deltas when they are asked for.
+#####################################################################################################################
+
+def networkDelta(seed_graph,graph):
+    # return the changes that make graph from seed_graph (both intervalgraph.Graph instances) as a dictionary with
+    # 'nodes' : labels of the added nodes, in the order of their vertices in graph
+    # 'edges' : added edges as [source label, target label, regulation]
+    # 'swaps' : seed edges with a different regulation, as [source label, target label, new regulation]
+    # 'removed' : seed edges that are not in graph, as [source label, target label]
+    # entries with nothing in them are left out
+    seedlabels = set( seed_graph.vertex_label(v) for v in seed_graph.vertices() )
+    labels = [ graph.vertex_label(v) for v in sorted(graph.vertices()) ]
+    if not seedlabels.issubset(labels):
+        raise ValueError("Network is missing nodes of the seed network.")
+    seededges = labeledEdges(seed_graph)
+    edges = labeledEdges(graph)
+    delta = {}
+    delta['nodes'] = [ n for n in labels if n not in seedlabels ]
+    delta['edges'] = [ [s,t,r] for (s,t),r in sorted(edges.items()) if (s,t) not in seededges ]
+    delta['swaps'] = [ [s,t,r] for (s,t),r in sorted(edges.items()) if (s,t) in seededges and seededges[(s,t)] != r ]
+    delta['removed'] = [ [s,t] for (s,t) in sorted(seededges) if (s,t) not in edges ]
+    return dict( (key,value) for key,value in delta.items() if value )
+
+def applyDelta(seed_graph,delta):
+    # return a new graph made from seed_graph by the changes in delta (see networkDelta)
+    # added nodes are numbered after the seed nodes in the order they are listed
+    graph = seed_graph.clone()
+    N = len(graph.vertices())
+    for k,label in enumerate(delta.get('nodes',[])):
+        graph.add_vertex(N+k,label=label)
+    vertex = dict( (graph.vertex_label(v),v) for v in graph.vertices() )
+    for s,t in delta.get('removed',[]):
+        graph.remove_edge(vertex[s],vertex[t])
+    for s,t,r in delta.get('edges',[]) + delta.get('swaps',[]):
+        graph.add_edge(vertex[s],vertex[t],label=r)
+    return graph
+
+def deltaGraph(seed_graph,delta):
+    # return the graph of the seed nodes and the added nodes (numbered as in applyDelta) with only the added edges
+    graph = intervalgraph.Graph()
+    for v in seed_graph.vertices():
+        graph.add_vertex(v,label=seed_graph.vertex_label(v))
+    N = len(graph.vertices())
+    for k,label in enumerate(delta.get('nodes',[])):
+        graph.add_vertex(N+k,label=label)
+    vertex = dict( (graph.vertex_label(v),v) for v in graph.vertices() )
+    for s,t,r in delta.get('edges',[]):
+        graph.add_edge(vertex[s],vertex[t],label=r)
+    return graph
+
+def labeledEdges(graph):
+    # the edges of graph as a dictionary (source label, target label) -> regulation
+    return dict( ((graph.vertex_label(u),graph.vertex_label(v)),graph.edge_label(u,v)) for (u,v) in graph.edges() )
+
+def readSeedSpec(path):
+    # return the seed network spec of a family file without reading the deltas
+    with open(path,'r') as f:
+        return str(json.loads(f.readline())['seed'])
+
+def getNetworkSpecFromResults(results,family=None):
+    # return the network spec of a results dictionary made by summaryJSON.py, which holds either the network spec or its
+    # delta from the seed network of family (a FamilyReader); family is only needed for deltas
+    if "Network" in results: return results["Network"]
+    if family is None:
+        raise ValueError("Results store a network delta, so the family file is needed to rebuild the network.")
+    return intervalgraph.createEssentialNetworkSpecFromGraph(applyDelta(family.seed_graph(),results["NetworkDelta"]))
+
+
+class FamilyWriter(object):
+    """ Writes seed_spec and the deltas of network specs from it to the family file path. """
+
+    def __init__(self, path, seed_spec):
+        self.file_ = open(path,'w')
+        self.seed_ = intervalgraph.getGraphFromNetworkSpec(seed_spec)
+        self.file_.write(json.dumps({"seed" : seed_spec})+'\n')
+        # the seed is all that readSeedSpec needs while the family is being written
+        self.file_.flush()
+
+    def add(self, uid, network_spec):
+        """ Store the delta of network_spec from the seed network under uid """
+        delta = networkDelta(self.seed_,intervalgraph.getGraphFromNetworkSpec(network_spec))
+        delta['uid'] = uid
+        self.file_.write(json.dumps(delta,separators=(',',':'),sort_keys=True)+'\n')
+
+    def close(self):
+        self.file_.close()
+
+
+class FamilyReader(object):
+    """ Reads a family file. The deltas are held as read, and graphs and network specs are rebuilt on request. """
+
+    def __init__(self, path):
+        self.uids_ = []
+        self.deltas_ = {}
+        with open(path,'r') as f:
+            self.seed_spec_ = str(json.loads(f.readline())['seed'])
+            for line in f:
+                if not line.strip(): continue
+                delta = json.loads(line)
+                uid = str(delta.pop('uid'))
+                self.uids_.append(uid)
+                self.deltas_[uid] = delta
+        self.seed_ = intervalgraph.getGraphFromNetworkSpec(self.seed_spec_)
+
+    def seed_spec(self):
+        """ Return the seed network spec """
+        return self.seed_spec_
+
+    def seed_graph(self):
+        """ Return a copy of the seed network as an intervalgraph.Graph """
+        return self.seed_.clone()
+
+    def uids(self):
+        """ Return the uids of the stored networks in the order they were written """
+        return list(self.uids_)
+
+    def delta(self, uid):
+        """ Return the delta of network uid from the seed network (see networkDelta) """
+        return self.deltas_[uid]
+
+    def graph(self, uid):
+        """ Return network uid as an intervalgraph.Graph """
+        return applyDelta(self.seed_,self.deltas_[uid])
+
+    def network_spec(self, uid):
+        """ Return the essential network spec of network uid """
+        return intervalgraph.createEssentialNetworkSpecFromGraph(self.graph(uid))
+
+    def __iter__(self):
+        """ Iterate over (uid, delta) pairs in the order they were written """
+        return ( (uid,self.deltas_[uid]) for uid in self.uids_ )
+
+    def __len__(self):
+        return len(self.uids_)
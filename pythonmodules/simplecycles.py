@@ -126,7 +126,7 @@ def test():
     minima = [ [ str(i)+ " min", [e[0][0],e[0][-1] ] ] for i,e in enumerate(extrema)  ]
     maxima = [ [ str(i)+ " max", [e[1][0],e[1][-1] ] ] for i,e in enumerate(extrema)  ]
     extrema = minima + maxima
-    graph = ig.IntervalGraph(extrema).transitive_reduction()
+    graph = ig.ReducedIntervalGraph(extrema)
     answer = {"0 min":["2 max"],"2 max":["3 min"],"1 min":["3 min"],"3 min":["0 max"],"0 max":["3 max"],"3 max":["2 min"],"2 min":["1 max"],"1 max":[]}
     for v in graph.vertices():
         # print graph.vertex_label(v), [graph.vertex_label(w) for w in  graph.adjacencies(v)]
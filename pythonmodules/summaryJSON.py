@@ -1,16 +1,23 @@
 import sys,json
+import intervalgraph,perturbationfamily
 
 network_spec_file=sys.argv[1]
 pattern_spec_file=sys.argv[2]
 results_file=sys.argv[3]
 summary_str=sys.argv[4]
 nummatches=sys.argv[5]
+# optional family file of network deltas (see perturbationfamily.py); "None" means store the whole network
+family_file=sys.argv[6] if len(sys.argv) > 6 and sys.argv[6] != "None" else ""
 
 results_dict = dict()
 
 with open(network_spec_file,'r') as nf:
     networkstr = nf.read()
-results_dict["Network"]=networkstr
+if family_file:
+    seed_graph = intervalgraph.getGraphFromNetworkSpec(perturbationfamily.readSeedSpec(family_file))
+    results_dict["NetworkDelta"]=perturbationfamily.networkDelta(seed_graph,intervalgraph.getGraphFromNetworkSpec(networkstr))
+else:
+    results_dict["Network"]=networkstr
 
 if pattern_spec_file:
     with open(pattern_spec_file,'r') as pf:
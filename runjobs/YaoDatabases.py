@@ -1,14 +1,17 @@
 from pythonmodules.makejobs import Job
+import pythonmodules.perturbationfamily as pf
 import json, subprocess
 
-def makeYaoDatabases(fname='4D_2016_08_25_Yao.json'):
+def makeYaoDatabases(fname='4D_2016_08_25_Yao.json',family_file=None):
+    # family_file is the family file of results that store network deltas (see pythonmodules/perturbationfamily.py)
+    family = pf.FamilyReader(family_file) if family_file else None
     with open(fname,'r') as Yf:
         lod = json.load(Yf)
     subprocess.call('mkdir YaoNetworks',shell=True)
     N = len(str(len(lod)))
     for k,d in enumerate(lod):
         uid = str(k).zfill(N)
-        network_spec = d["Network"].replace(': E\n','\n',1)
+        network_spec = pf.getNetworkSpecFromResults(d,family).replace(': E\n','\n',1)
         open('YaoNetworks/network'+uid+'.txt','w').write(network_spec)
     params = {}
     params['dsgrn'] = '../DSGRN'
@@ -5,7 +5,7 @@
 
 # get paths
 PATH_TO_DSGRN=$1
-NETWORKDIR=$2
+NETWORKDIR=$2 # a folder of network files, or a single network file
 PATTERNDIR=$3
 DATABASEDIR=$4
 RESULTSDIR=$5
@@ -14,19 +14,27 @@ QUERYFILE=$6 # name of a shell script that performs an FP Query and summary stat
 HELPER_SCRIPT_CMD=$7
 RUN_TYPE=$8
 RMDB=$9
-RMNF=$10
+RMNF=${10}
+FAMILYFILE=${11} # family file of network deltas (see pythonmodules/perturbationfamily.py), or None to store whole networks in the results
+
+# single network files are passed in when networks are submitted as soon as they are constructed
+if [ -f $NETWORKDIR ]; then
+	NETWORKFILES=$NETWORKDIR
+else
+	NETWORKFILES=$NETWORKDIR/*
+fi
 
 # for each perturbation, start a scheduled job for analysis
-for NETWORKFILE in $NETWORKDIR/*; do
+for NETWORKFILE in $NETWORKFILES; do
 	# strip the uniquely identifying number off of the filename
 	NETWORKID=`basename $NETWORKFILE | sed 's/[^0-9]*//g'`
 	# start a scheduled job
 	if [[ $RUN_TYPE = "qsub" ]]; then
-		qsub $HELPER_SCRIPT_CMD $PATH_TO_DSGRN $NETWORKFILE $PATTERNDIR $DATABASEDIR $RESULTSDIR $NETWORKID $QUERYFILE $RMDB $RMNF
+		qsub $HELPER_SCRIPT_CMD $PATH_TO_DSGRN $NETWORKFILE $PATTERNDIR $DATABASEDIR $RESULTSDIR $NETWORKID $QUERYFILE $RMDB $RMNF $FAMILYFILE
 	elif [[ $RUN_TYPE = "sbatch" ]]; then
-		sbatch $HELPER_SCRIPT_CMD $PATH_TO_DSGRN $NETWORKFILE $PATTERNDIR $DATABASEDIR $RESULTSDIR $NETWORKID $QUERYFILE $RMDB $RMNF
+		sbatch $HELPER_SCRIPT_CMD $PATH_TO_DSGRN $NETWORKFILE $PATTERNDIR $DATABASEDIR $RESULTSDIR $NETWORKID $QUERYFILE $RMDB $RMNF $FAMILYFILE
 	elif [[ $RUN_TYPE = "local" ]]; then
-		. $HELPER_SCRIPT_CMD $PATH_TO_DSGRN $NETWORKFILE $PATTERNDIR $DATABASEDIR $RESULTSDIR $NETWORKID $QUERYFILE $RMDB $RMNF
+		. $HELPER_SCRIPT_CMD $PATH_TO_DSGRN $NETWORKFILE $PATTERNDIR $DATABASEDIR $RESULTSDIR $NETWORKID $QUERYFILE $RMDB $RMNF $FAMILYFILE
 	fi
 done
 
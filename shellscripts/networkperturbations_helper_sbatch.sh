@@ -23,6 +23,7 @@ NETWORKID=$6
 QUERYFILE=$7
 RMDB=$8
 RMNF=$9
+FAMILYFILE=${10}
 
 DATABASEFILE="$DATABASEDIR/database$NETWORKID.db"
 
@@ -59,13 +60,13 @@ if [[ `ls -A $PATTERNDIR` ]]; then
 
 		# dump inputs and results to json
 		RESULTSFILE=$RESULTSDIR/results$NUM.txt
-		python pythonmodules/summaryJSON.py $NETWORKFILE $PATTERNFILE $RESULTSFILE "$SUMMARYSTR" $MATCHES
+		python pythonmodules/summaryJSON.py $NETWORKFILE $PATTERNFILE $RESULTSFILE "$SUMMARYSTR" $MATCHES $FAMILYFILE
 
 		rm $PATTERNFILE $MATCHFILE
 	done
 else
 	RESULTSFILE=$RESULTSDIR/results$NETWORKID.txt
-	python pythonmodules/summaryJSON.py $NETWORKFILE "" $RESULTSFILE "$SUMMARYSTR" ""
+	python pythonmodules/summaryJSON.py $NETWORKFILE "" $RESULTSFILE "$SUMMARYSTR" "" $FAMILYFILE
 fi
 
 # delete intermediate files; it is possible that $STABLEFCLIST does not exist
@@ -0,0 +1,28 @@
+#!/bin/bash
+
+# make degree-preserving shuffles of a network for a null model, one network file each, and analyze them like network perturbations
+# dependencies: python 2.7 with numpy, DSGRN python module, and the dependencies of networkperturbations.sh
+
+# get paths
+PATH_TO_DSGRN=$1
+NETWORKFILE=$2
+NUMSHUFFLES=$3
+MAXPARAMS=$4
+TIME_TO_WAIT=$5
+PATTERNDIR=$6
+DATABASEDIR=$7
+RESULTSDIR=$8
+QUERYFILE=$9
+HELPER_SCRIPT_CMD=${10}
+RUN_TYPE=${11}
+RMDB=${12}
+RMNF=${13}
+SEED=${14} # optional, for reproducible shuffles
+
+# the shuffles are written next to the databases
+SHUFFLEDIR="$DATABASEDIR/../shuffles"
+mkdir -p $SHUFFLEDIR
+python pythonmodules/networkshuffles.py $NETWORKFILE $NUMSHUFFLES $MAXPARAMS $TIME_TO_WAIT $SHUFFLEDIR $SEED
+
+# the original network is network0 and the shuffles follow
+. shellscripts/networkperturbations.sh $PATH_TO_DSGRN $SHUFFLEDIR $PATTERNDIR $DATABASEDIR $RESULTSDIR $QUERYFILE $HELPER_SCRIPT_CMD $RUN_TYPE $RMDB $RMNF None